@@ -1,14 +1,34 @@
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.validators import UniqueTogetherValidator
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import (TokenObtainPairSerializer,
+                                                  TokenRefreshSerializer)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.db import transaction
 
+from assistance.authentication import revoked_tokens
+from assistance.versioning import bump_table_versions
 from users.models import User
+from recipes.signals import recipe_ingredients_changed
 from recipes.models import (Recipe, Ingredient, Tag,
                             AmountOfIngredient, Favorite, Follow, Cart,
                             Base64ImageField)
 
 
+class RecipeShortSerializer(serializers.ModelSerializer):
+    """Краткая карточка рецепта для списка подписок."""
+    image = Base64ImageField(read_only=True)
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'name', 'image', 'cooking_time')
+
+
 class UserReadOnlySerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
@@ -28,13 +48,25 @@ class UserReadOnlySerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, user):
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
         follower = self.context.get('request').user
         return Follow.objects.filter(user=follower, following=user).exists()
 
     def get_recipes(self, user):
-        return user.recipes.all()
+        if hasattr(user, 'limited_recipes'):
+            recipes = user.limited_recipes
+        else:
+            recipes = user.recipes.all()
+            recipes_limit = self.context.get('recipes_limit')
+            if recipes_limit:
+                recipes = recipes[:recipes_limit]
+        return RecipeShortSerializer(
+            recipes, many=True, context=self.context).data
 
     def get_recipes_count(self, user):
+        if hasattr(user, 'recipes_count'):
+            return user.recipes_count
         return user.recipes.count()
 
 
@@ -54,6 +86,29 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class JWTCreateSerializer(TokenObtainPairSerializer):
+    """Выдает пару JWT по email и паролю, как djoser выдает Token."""
+    username_field = 'email'
+
+    def validate(self, attrs):
+        user = User.objects.filter(email=attrs['email']).first()
+        if (user is None or not user.check_password(attrs['password'])
+                or not api_settings.USER_AUTHENTICATION_RULE(user)):
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account')
+        refresh = self.get_token(user)
+        return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+class JWTRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        if refresh.get(api_settings.JTI_CLAIM) in revoked_tokens:
+            raise TokenError('Токен отозван.')
+        return super().validate(attrs)
+
+
 class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -112,6 +167,13 @@ class CartSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления и удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=100)
+
+
 class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -158,6 +220,7 @@ class RecipeReadOnlySerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -170,16 +233,38 @@ class RecipeReadOnlySerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time',
         )
 
+    def get_images(self, recipe):
+        """Ссылки на уменьшенные копии, пока их нет - на оригинал."""
+        if not recipe.image:
+            return None
+        request = self.context.get('request')
+        derivatives = recipe.image_derivatives
+        if derivatives.get('source') != recipe.image.name:
+            derivatives = {}
+        urls = {}
+        for name in settings.IMAGE_DERIVATIVES:
+            for key in (name, f'{name}_webp'):
+                url = (recipe.image.storage.url(derivatives[key])
+                       if key in derivatives else recipe.image.url)
+                urls[key] = (request.build_absolute_uri(url)
+                             if request else url)
+        return urls
+
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context.get('request').user
         if not user.is_anonymous:
             return Favorite.objects.filter(user=user, recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context.get('request').user
         if not user.is_anonymous:
             return Cart.objects.filter(user=user, recipe=recipe).exists()
@@ -188,8 +273,7 @@ class RecipeReadOnlySerializer(serializers.ModelSerializer):
 class RecipeCreateOrUpdateSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = IngredientsCreateOrUpdateSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField()
     cooking_time = serializers.IntegerField(
         validators=(MinValueValidator(1),)
@@ -213,11 +297,17 @@ class RecipeCreateOrUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Рецепт должен содержать минимум 1 ингредиент!'
             )
-        for ingredient in ingredients:
-            if ingredients.count(ingredient) > 1:
-                raise serializers.ValidationError(
-                    'У рецепта не может быть два одинаковых ингредиента!'
-                )
+        ids = {ingredient['id'] for ingredient in ingredients}
+        if len(ids) != len(ingredients):
+            raise serializers.ValidationError(
+                'У рецепта не может быть два одинаковых ингредиента!'
+            )
+        missing = ids - set(Ingredient.objects.filter(
+            id__in=ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}.'
+            )
         return ingredients
 
     def validate_tags(self, tags):
@@ -225,6 +315,13 @@ class RecipeCreateOrUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Для рецепта нужен хотя бы один тег!'
             )
+        tags = set(tags)
+        missing = tags - set(Tag.objects.filter(
+            id__in=tags).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {sorted(missing)}.'
+            )
         return tags
 
     def validate_cooking_time(self, cooking_time):
@@ -248,22 +345,67 @@ class RecipeCreateOrUpdateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.create_ingredients_amounts(recipe=recipe,
-                                        ingredients=ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            self.create_ingredients_amounts(recipe=recipe,
+                                            ingredients=ingredients)
+        recipe_ingredients_changed.send(
+            sender=Recipe, recipe=recipe, previous={},
+            current=self.ingredients_map(ingredients))
         return recipe
 
+    def update_ingredients_amounts(self, ingredients, recipe):
+        '''Приводит строки рецепта к новому составу, трогая только отличия.
+
+        Возвращает прежний состав {ingredient_id: amount}.'''
+        rows = {row.ingredient_id: row
+                for row in recipe.amounts_of_ingredients.all()}
+        previous = {pk: row.amount for pk, row in rows.items()}
+        current = self.ingredients_map(ingredients)
+        changed = []
+        for pk, amount in current.items():
+            if pk in rows and rows[pk].amount != amount:
+                rows[pk].amount = amount
+                changed.append(rows[pk])
+        removed = set(rows) - set(current)
+        if removed:
+            AmountOfIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        AmountOfIngredient.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients_amounts(recipe=recipe, ingredients=[
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in rows
+        ])
+        if previous != current:
+            bump_table_versions(AmountOfIngredient)
+        return previous
+
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients_amounts(recipe=instance,
-                                        ingredients=ingredients)
-        return super().update(instance, validated_data)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        with transaction.atomic():
+            if tags is not None:
+                instance.tags.set(tags)
+            if ingredients is not None:
+                previous = self.update_ingredients_amounts(
+                    recipe=instance, ingredients=ingredients)
+                current = self.ingredients_map(ingredients)
+                if previous != current:
+                    recipe_ingredients_changed.send(
+                        sender=Recipe, recipe=instance, previous=previous,
+                        current=current)
+            return super().update(instance, validated_data)
+
+    @staticmethod
+    def ingredients_map(ingredients):
+        return {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
 
     def to_representation(self, data):
+        data = Recipe.objects.with_relations().with_user_flags(
+            self.context['request'].user).get(pk=data.pk)
         return RecipeReadOnlySerializer(
             context=self.context).to_representation(data)
@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import TagViewSet, IngredientViewSet, RecipeViewSet, UserViewSet
+from .views import (TagViewSet, IngredientViewSet, RecipeViewSet, UserViewSet,
+                    JWTCreateView, JWTRefreshView, JWTRevokeView)
 
 
 router = DefaultRouter()
@@ -13,5 +14,9 @@ router.register('users', UserViewSet, basename='users')
 
 urlpatterns = [
     path('api/', include(router.urls)),
+    path('api/auth/jwt/create/', JWTCreateView.as_view(), name='jwt-create'),
+    path('api/auth/jwt/refresh/', JWTRefreshView.as_view(),
+         name='jwt-refresh'),
+    path('api/auth/jwt/revoke/', JWTRevokeView.as_view(), name='jwt-revoke'),
     path('api/auth/', include('djoser.urls.authtoken'))
 ]
@@ -1,30 +1,44 @@
-import io
-
 from rest_framework import viewsets, permissions, status
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.views import (TokenObtainPairView,
+                                            TokenRefreshView)
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.http import FileResponse
-from django.db.models import Sum
-from reportlab.lib.units import inch
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-
-from recipes.models import (Recipe, Favorite, Cart, Ingredient,
-                            Tag, Follow, AmountOfIngredient)
-from .serializers import (RecipeCreateOrUpdateSerializer,
+
+from recipes.models import (Recipe, Favorite, Cart, Ingredient, Tag, Follow,
+                            AmountOfIngredient)
+from .serializers import (JWTCreateSerializer,
+                          JWTRefreshSerializer,
+                          RecipeCreateOrUpdateSerializer,
+                          RecipeIdsSerializer,
                           RecipeReadOnlySerializer,
                           TagSerializer,
                           IngredientSerializer,
-                          FollowSerializer,
                           UserSerializer,
                           UserReadOnlySerializer)
 from .permissions import IsAuthorOrReadOnly
-from assistance.pagination import CustomPagination
+from assistance.authentication import revoke
+from assistance.feed import (backfill, decode_cursor, encode_cursor, prune,
+                             timeline)
+from assistance.ingredient_index import ingredient_index
+from assistance.mixins import CachedListMixin, ConditionalGetMixin
+from assistance.pagination import CustomPagination, RecipePagination
+from assistance.pantry import pantry_index
+from assistance.search import search_recipes
+from assistance.similarity import similar_recipes
+from assistance.shopping_list import (SHOPPING_LIST_RENDERERS,
+                                      shopping_list_response)
 from users.models import User
-from assistance.utils import favorite_or_cart
+from assistance.utils import (change_selection, favorite_or_cart,
+                              filter_by_tags, get_recipes_limit,
+                              subscriptions_queryset)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -35,13 +49,7 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, url_path='me', methods=('get',),
             permission_classes=(IsAuthenticated,))
     def me(self, request):
-        serializer = self.get_serializer(
-            request.user, data=request.data, partial=True
-        )
-        serializer.is_valid(raise_exception=True)
-
-        serializer.save()
-
+        serializer = self.get_serializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, url_path='subscribe', methods=('post', 'delete'),
@@ -57,12 +65,16 @@ class UserViewSet(viewsets.ModelViewSet):
                 return Response({'detail': 'Уже подписаны!'},
                                 status=status.HTTP_400_BAD_REQUEST)
             Follow.objects.create(user=user, following=following).save()
-            data = UserReadOnlySerializer(following,
-                                          context={'request': request}).data
+            backfill((user.id,), following.id)
+            data = UserReadOnlySerializer(
+                following,
+                context={'request': request,
+                         'recipes_limit': get_recipes_limit(request)}).data
             return Response(data,
                             status=status.HTTP_201_CREATED)
         if sub_status:
             change_subscription_status.delete()
+            prune(user.id, following.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'detail': 'Такой подписки нет'},
                         status=status.HTTP_400_BAD_REQUEST)
@@ -70,21 +82,51 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, url_path='subscriptions', methods=('get',),
             permission_classes=(permissions.IsAuthenticated,))
     def subscriptions(self, request):
-        queryset = Follow.objects.filter(user=request.user)
-        if queryset.exists():
-            queryset_pag = self.paginate_queryset(queryset)
-            serializer = FollowSerializer(
-                queryset_pag, context={'request': request}, many=True,)
-            return self.get_paginated_response(serializer.data)
-        return Response({'detail': 'Подписок нет'},
-                        status=status.HTTP_400_BAD_REQUEST)
+        recipes_limit = get_recipes_limit(request)
+        queryset = subscriptions_queryset(request.user, recipes_limit)
+        queryset_pag = self.paginate_queryset(queryset)
+        serializer = UserReadOnlySerializer(
+            queryset_pag, many=True,
+            context={'request': request, 'recipes_limit': recipes_limit})
+        return self.get_paginated_response(serializer.data)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,
                           IsAuthorOrReadOnly)
-    pagination_class = LimitOffsetPagination
+    pagination_class = RecipePagination
+    etag_models = (Recipe, Recipe.tags.through, AmountOfIngredient, Tag,
+                   Ingredient, User, Favorite, Cart)
+    ordering_fields = ('pub_date', 'favorites_count', 'carts_count')
+
+    def get_ordering(self):
+        """Порядок из ?ordering= с pub_date и id для однозначности."""
+        ordering = self.request.query_params.get('ordering', '')
+        if ordering.lstrip('-') not in self.ordering_fields:
+            return None
+        # Одно направление у всех полей: так порядок совпадает с индексом
+        # (при обратном чтении тоже) и годится для ключа курсора.
+        sign = '-' if ordering.startswith('-') else ''
+        if ordering.lstrip('-') == 'pub_date':
+            return (ordering, sign + 'id')
+        return (ordering, sign + 'pub_date', sign + 'id')
+
+    def object_validators(self, request):
+        try:
+            dates = Recipe.objects.filter(pk=self.kwargs['pk']).values_list(
+                'pub_date', 'updated_at').first()
+        except (TypeError, ValueError):
+            dates = None
+        if dates is None:
+            return None, None
+        pub_date, updated_at = dates
+        # Last-Modified не отдается: избранное, корзина и связанные
+        # таблицы меняют ответ, не трогая updated_at.
+        return self.make_etag(
+            request, pub_date, updated_at,
+            self.table_versions(exclude=(Recipe,))
+        ), None
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -95,17 +137,96 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
     def get_queryset(self):
-        data = Recipe.objects.all()
+        data = Recipe.objects.with_relations().with_user_flags(
+            self.request.user)
         if self.request.GET.get('is_favorited') == "1":
-            data = data.filter(fav__user=self.request.user)
+            data = data.filter(is_favorited=True)
         if self.request.GET.get('is_in_shopping_cart') == "1":
-            data = data.filter(recipe__user=self.request.user)
+            data = data.filter(is_in_shopping_cart=True)
         if self.request.GET.get('author'):
             data = data.filter(author__id=self.request.GET.get('author'))
-        if self.request.GET.get('tags'):
-            data = data.filter(tags__in=[self.request.GET.get('tags')])
+        if self.request.GET.getlist('tags'):
+            data = filter_by_tags(data, self.request.GET.getlist('tags'))
+        if self.request.GET.get('search'):
+            data = search_recipes(data, self.request.GET.get('search'))
+        if self.get_ordering():
+            data = data.order_by(*self.get_ordering())
         return (data)
 
+    @action(detail=False, url_path='match', methods=('get',))
+    def match(self, request):
+        try:
+            ingredients = [
+                int(pk) for pk in request.query_params.getlist('ingredients')]
+            limit = max(1, min(int(request.query_params.get(
+                'limit', settings.REST_FRAMEWORK['PAGE_SIZE'])), 100))
+        except ValueError:
+            return Response({'detail': 'Ожидались числовые id ингредиентов.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        scores = pantry_index.match(ingredients, limit)
+        recipes = Recipe.objects.with_relations().with_user_flags(
+            request.user).in_bulk([recipe_id for recipe_id, *_ in scores])
+        data = []
+        for recipe_id, matched, missing in scores:
+            if recipe_id not in recipes:
+                continue
+            item = RecipeReadOnlySerializer(
+                recipes[recipe_id], context={'request': request}).data
+            item['matched_count'] = matched
+            item['missing_count'] = missing
+            item['coverage'] = round(matched / (matched + missing), 3)
+            data.append(item)
+        return Response(data)
+
+    @action(detail=False, url_path='feed', methods=('get',),
+            permission_classes=(permissions.IsAuthenticated,))
+    def feed(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get(
+                'limit', settings.REST_FRAMEWORK['PAGE_SIZE'])), 100))
+            cursor = request.query_params.get('cursor')
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response({'detail': 'Неверный limit или cursor.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        rows = timeline(request.user, limit, before)
+        recipes = Recipe.objects.with_relations().with_user_flags(
+            request.user).in_bulk([pk for _, pk in rows])
+        next_link = None
+        if len(rows) == limit:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), 'cursor',
+                encode_cursor(rows[-1]))
+        return Response({
+            'next': next_link,
+            'previous': None,
+            'count': None,
+            'results': RecipeReadOnlySerializer(
+                [recipes[pk] for _, pk in rows if pk in recipes],
+                many=True, context={'request': request}).data
+        })
+
+    @action(detail=True, url_path='similar', methods=('get',))
+    def similar(self, request, pk):
+        recipe = self.get_object()
+        try:
+            limit = max(1, min(int(request.query_params.get(
+                'limit', settings.REST_FRAMEWORK['PAGE_SIZE'])), 100))
+        except ValueError:
+            limit = settings.REST_FRAMEWORK['PAGE_SIZE']
+        scores = similar_recipes(recipe.pk, limit)
+        recipes = Recipe.objects.with_relations().with_user_flags(
+            request.user).in_bulk([recipe_id for recipe_id, _ in scores])
+        data = []
+        for recipe_id, similarity in scores:
+            if recipe_id not in recipes:
+                continue
+            item = RecipeReadOnlySerializer(
+                recipes[recipe_id], context={'request': request}).data
+            item['similarity'] = round(similarity, 3)
+            data.append(item)
+        return Response(data)
+
     @action(detail=True, url_path='favorite', methods=('post', 'delete'),
             permission_classes=(permissions.IsAuthenticated,))
     def favorite(self, request, pk):
@@ -116,43 +237,83 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk):
         return favorite_or_cart(self, Cart, pk)
 
-    @action(detail=False, url_path='download_shopping_cart', methods=('get',),
+    def bulk_selection(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add = request.method == 'POST'
+        changed = change_selection(model, request.user.id,
+                                   serializer.validated_data['recipes'], add)
+        return Response({'recipes': changed},
+                        status=status.HTTP_201_CREATED if add
+                        else status.HTTP_200_OK)
+
+    @action(detail=False, url_path='favorite', methods=('post', 'delete'),
             permission_classes=(permissions.IsAuthenticated,))
+    def favorite_bulk(self, request):
+        return self.bulk_selection(request, Favorite)
+
+    @action(detail=False, url_path='shopping_cart', methods=('post', 'delete'),
+            permission_classes=(permissions.IsAuthenticated,))
+    def shopping_cart_bulk(self, request):
+        return self.bulk_selection(request, Cart)
+
+    @action(detail=False, url_path='download_shopping_cart', methods=('get',),
+            permission_classes=(permissions.IsAuthenticated,),
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download(self, request):
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter, bottomup=0)
-        textob = p.beginText()
-        textob.setTextOrigin(inch, inch)
-        textob.setFont("Helvetica", 14)
-        objs = (
-            AmountOfIngredient.objects.filter(
-                recipe__in=list(request.user.buyer.values_list(
-                    'recipe',
-                    flat=True)),)).select_related('recipes').values(
-                        'ingredient__name',
-                        'ingredient__measurement_unit',).annotate(
-                            summa=Sum('amount'))
-        for obj in objs:
-            line_out = (str(obj['ingredient__name'])
-                        + str(obj['ingredient__measurement_unit'])
-                        + str(obj['summa']))
-            textob.textLine(line_out)
-        p.drawText(textob)
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-
-        return FileResponse(buffer, as_attachment=True, filename="venue.pdf")
-
-
-class TagViewSet(viewsets.ModelViewSet):
+        return shopping_list_response(request.user,
+                                      request.accepted_renderer.format)
+
+
+class TagViewSet(ConditionalGetMixin, CachedListMixin,
+                 viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,
                           IsAuthorOrReadOnly)
     pagination_class = LimitOffsetPagination
+    etag_models = (Tag,)
+    etag_per_user = False
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, CachedListMixin,
+                        viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    pagination_class = None
+    etag_models = (Ingredient,)
+    etag_per_user = False
+
+    def list(self, request):
+        return self.conditional(
+            request, self.collection_validators(request),
+            self.cached_response, self.search)
+
+    def search(self, request):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(
+                name, settings.INGREDIENT_SEARCH_LIMIT))
+        return Response(ingredient_index.all())
+
+
+class JWTCreateView(TokenObtainPairView):
+    serializer_class = JWTCreateSerializer
+
+
+class JWTRefreshView(TokenRefreshView):
+    serializer_class = JWTRefreshSerializer
+
+
+class JWTRevokeView(APIView):
+    """Отзывает refresh-токен и access-токен, с которым пришел запрос."""
+
+    def post(self, request):
+        try:
+            refresh = tokens.RefreshToken(request.data.get('refresh', ''))
+        except TokenError as error:
+            raise InvalidToken(error.args[0])
+        revoke(refresh)
+        if isinstance(request.auth, tokens.Token):
+            revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,99 @@
+import time
+from threading import Lock
+
+from django.conf import settings
+from django.db import router
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from users.models import RevokedToken, User
+from .versioning import get_changes, get_version, record_change
+
+REVOKED_VERSION = 'revoked_tokens'
+
+
+class RevokedTokens:
+    """Множество jti отозванных токенов в памяти процесса.
+
+    Новые отзывы приходят через журнал версии revoked_tokens в кэше, а
+    раз в JWT_REVOCATION_SYNC_INTERVAL секунд множество перечитывается
+    из RevokedToken целиком, заодно забывая истекшие токены.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._synced = None
+        self._jtis = set()
+
+    def _refresh(self):
+        version = get_version(REVOKED_VERSION)
+        stale = (self._synced is None or time.monotonic() - self._synced
+                 > settings.JWT_REVOCATION_SYNC_INTERVAL)
+        if version == self._version and not stale:
+            return
+        with self._lock:
+            changes = None if stale else get_changes(
+                REVOKED_VERSION, self._version, version)
+            if changes is None:
+                self._jtis = set(RevokedToken.objects.filter(
+                    expires_at__gt=timezone.now()
+                ).values_list('jti', flat=True))
+                self._synced = time.monotonic()
+            else:
+                self._jtis.update(changes)
+            self._version = version
+
+    def __contains__(self, jti):
+        self._refresh()
+        return jti in self._jtis
+
+
+revoked_tokens = RevokedTokens()
+
+
+def revoke(token):
+    """Отзывает токен до истечения его срока во всех процессах."""
+    jti = token[api_settings.JTI_CLAIM]
+    RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    RevokedToken.objects.get_or_create(jti=jti, defaults={
+        'expires_at': datetime_from_epoch(token['exp'])})
+    record_change(REVOKED_VERSION, jti)
+
+
+def deferred_user(user_id):
+    """Пользователь, у которого известен только pk.
+
+    Для фильтров и сравнений базы не нужно; при обращении к любому другому
+    полю все поля загружаются одним запросом, а не по одному.
+    """
+    user = User.from_db(router.db_for_read(User), ['id'], [user_id])
+    refresh_from_db = user.refresh_from_db
+
+    def load_deferred(using=None, fields=None):
+        if fields is not None:
+            fields = set(fields) | user.get_deferred_fields()
+        refresh_from_db(using=using, fields=fields)
+
+    user.refresh_from_db = load_deferred
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация без запросов к базе на каждый запрос.
+
+    Подпись и срок проверяются по токену, отзыв — по revoked_tokens.
+    Заблокированный пользователь теряет доступ, когда отозваны его токены
+    или истек срок access-токена.
+    """
+
+    def get_user(self, validated_token):
+        if validated_token.get(api_settings.JTI_CLAIM) in revoked_tokens:
+            raise InvalidToken('Токен отозван.')
+        try:
+            return deferred_user(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken('В токене нет id пользователя.')
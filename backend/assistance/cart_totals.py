@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.db import connections, router, transaction
+from django.db.models import Sum
+
+from recipes.models import AmountOfIngredient, Cart, ShoppingListItem
+
+
+def recipe_amounts(recipe_ids):
+    """Количество каждого ингредиента в рецептах: {ingredient_id: amount}."""
+    amounts = defaultdict(int)
+    for ingredient_id, amount in AmountOfIngredient.objects.filter(
+            recipe_id__in=recipe_ids).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+# Строки, которых еще нет, не заблокировать через SELECT FOR UPDATE, и две
+# параллельные корзины вставили бы одну и ту же позицию. Вставка с
+# ON CONFLICT прибавляет к существующей строке атомарно.
+UPSERT = (
+    'INSERT INTO {table} (user_id, ingredient_id, amount) VALUES {rows} '
+    'ON CONFLICT (user_id, ingredient_id) '
+    'DO UPDATE SET amount = {table}.amount + excluded.amount'
+)
+UPSERT_BATCH = 300
+
+
+def apply_deltas(user_ids, deltas):
+    """Прибавляет deltas к списку покупок каждого из пользователей."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    user_ids = set(user_ids)
+    if not deltas or not user_ids:
+        return
+    # Одинаковый порядок строк во всех транзакциях исключает взаимные
+    # блокировки.
+    rows = [(user_id, pk, deltas[pk])
+            for user_id in sorted(user_ids) for pk in sorted(deltas)]
+    alias = router.db_for_write(ShoppingListItem)
+    connection = connections[alias]
+    table = connection.ops.quote_name(ShoppingListItem._meta.db_table)
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH):
+            batch = rows[start:start + UPSERT_BATCH]
+            cursor.execute(UPSERT.format(
+                table=table, rows=', '.join(['(%s, %s, %s)'] * len(batch))
+            ), [value for row in batch for value in row])
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas, amount__lte=0
+        ).delete()
+
+
+def cart_changed(user_id, recipe_ids, sign):
+    """Рецепты добавлены (sign=1) в корзину или удалены (sign=-1) из нее."""
+    apply_deltas((user_id,), {
+        pk: sign * amount
+        for pk, amount in recipe_amounts(recipe_ids).items()
+    })
+
+
+def recipe_ingredients_changed(recipe, previous, current):
+    """Переносит изменение состава рецепта в корзины, где он лежит."""
+    deltas = {
+        pk: current.get(pk, 0) - previous.get(pk, 0)
+        for pk in set(previous) | set(current)
+    }
+    apply_deltas(
+        Cart.objects.filter(recipe=recipe).values_list('user_id', flat=True),
+        deltas
+    )
+
+
+def expected_totals(user_ids):
+    """Пересчитывает списки покупок пользователей по их корзинам."""
+    totals = defaultdict(dict)
+    rows = AmountOfIngredient.objects.filter(
+        recipe__recipe__user_id__in=user_ids
+    ).values_list('recipe__recipe__user_id', 'ingredient_id').annotate(
+        total=Sum('amount'))
+    for user_id, ingredient_id, total in rows:
+        totals[user_id][ingredient_id] = total
+    return totals
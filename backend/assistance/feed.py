@@ -0,0 +1,136 @@
+import base64
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_datetime
+
+from recipes.models import Follow, Recipe, TimelineEntry
+
+CELEBRITIES_KEY = 'feed:celebrities'
+PREVIOUS_CELEBRITIES_KEY = 'feed:celebrities:previous'
+
+
+def celebrity_ids():
+    """Авторы, чьи рецепты подмешиваются в ленту при чтении.
+
+    Набор пересчитывается раз в FEED_CELEBRITY_TIMEOUT. Авторам, которые
+    за это время перестали быть знаменитостями, ленты подписчиков
+    дополняются сразу, иначе их рецепты из ленты бы пропали.
+    """
+    ids = cache.get(CELEBRITIES_KEY)
+    if ids is not None:
+        return ids
+    ids = frozenset(Follow.objects.values('following').annotate(
+        followers=Count('pk')
+    ).filter(
+        followers__gt=settings.FEED_CELEBRITY_FOLLOWERS
+    ).values_list('following', flat=True))
+    previous = cache.get(PREVIOUS_CELEBRITIES_KEY, frozenset())
+    cache.set(CELEBRITIES_KEY, ids, settings.FEED_CELEBRITY_TIMEOUT)
+    cache.set(PREVIOUS_CELEBRITIES_KEY, ids, None)
+    for author_id in previous - ids:
+        backfill(followers(author_id), author_id)
+    return ids
+
+
+def followers(author_id):
+    return list(Follow.objects.filter(following_id=author_id).values_list(
+        'user_id', flat=True))
+
+
+def add_entries(user_ids, recipes):
+    """Раскладывает рецепты [(id, pub_date)] по лентам пользователей."""
+    entries = (
+        TimelineEntry(user_id=user_id, recipe_id=recipe_id, pub_date=date)
+        for recipe_id, date in recipes
+        for user_id in user_ids
+    )
+    while True:
+        batch = list(islice(entries, 1000))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(*recipes):
+    """Кладет новые рецепты в ленты подписчиков их авторов."""
+    by_author = defaultdict(list)
+    for recipe in recipes:
+        by_author[recipe.author_id].append((recipe.pk, recipe.pub_date))
+    celebrities = celebrity_ids()
+    for author_id, rows in by_author.items():
+        if author_id not in celebrities:
+            add_entries(followers(author_id), rows)
+
+
+def backfill(user_ids, author_id):
+    """Добавляет в ленты последние рецепты автора после подписки."""
+    if author_id in celebrity_ids():
+        return
+    add_entries(list(user_ids), list(
+        Recipe.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id').values_list(
+                'id', 'pub_date')[:settings.FEED_BACKFILL_RECIPES]))
+
+
+def prune(user_id, author_id):
+    """Убирает рецепты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id).delete()
+
+
+def timeline(user, limit, before=None):
+    """Id рецептов ленты [(pub_date, id)], свежие первыми.
+
+    Лента читается одним проходом по индексу (user, pub_date) таблицы
+    TimelineEntry; рецепты знаменитостей, на которых подписан user,
+    берутся из Recipe и сливаются с ней. before — (pub_date, id)
+    последнего рецепта предыдущей страницы.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    celebrities = celebrity_ids()
+    followed = list(Follow.objects.filter(
+        user=user, following_id__in=celebrities
+    ).values_list('following_id', flat=True)) if celebrities else []
+    recipes = Recipe.objects.filter(author_id__in=followed)
+    if before is not None:
+        pub_date, pk = before
+        entries = entries.filter(Q(pub_date__lt=pub_date)
+                                 | Q(pub_date=pub_date, recipe_id__lt=pk))
+        recipes = recipes.filter(Q(pub_date__lt=pub_date)
+                                 | Q(pub_date=pub_date, id__lt=pk))
+    sources = [entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit]]
+    if followed:
+        sources.append(recipes.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id')[:limit])
+    result = []
+    seen = set()
+    for row in heapq.merge(*sources, reverse=True):
+        if row[1] in seen:
+            continue
+        seen.add(row[1])
+        result.append(row)
+        if len(result) == limit:
+            break
+    return result
+
+
+def encode_cursor(row):
+    pub_date, pk = row
+    return base64.urlsafe_b64encode(
+        f'{pub_date.isoformat()}|{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(pub_date, id) из курсора ленты; ValueError, если курсор испорчен."""
+    pub_date, pk = base64.urlsafe_b64decode(
+        cursor.encode()).decode().split('|')
+    pub_date = parse_datetime(pub_date)
+    if pub_date is None:
+        raise ValueError(cursor)
+    return pub_date, int(pk)
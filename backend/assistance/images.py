@@ -0,0 +1,172 @@
+import base64
+import binascii
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import SpooledTemporaryFile
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers
+
+from .thumbnails import render_derivatives
+from .versioning import bump_table_versions
+
+logger = logging.getLogger(__name__)
+
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+def sniff_format(head):
+    """Определяет формат по сигнатуре файла, а не по data:image/X."""
+    for signature, format in SIGNATURES:
+        if head.startswith(signature):
+            return format
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def decode_base64_image(encoded, max_bytes, max_pixels):
+    """Декодирует base64 по частям во временный файл.
+
+    Размер проверяется до декодирования, а число пикселей берется из
+    заголовка изображения, поэтому слишком большие файлы отклоняются
+    раньше, чем попадут в память целиком.
+    """
+    encoded = encoded.strip()
+    if len(encoded) // 4 * 3 > max_bytes + 2:
+        raise serializers.ValidationError(
+            f'Изображение больше {max_bytes} байт.')
+    spool = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    size = 0
+    head = b''
+    for start in range(0, len(encoded), CHUNK_SIZE):
+        try:
+            chunk = base64.b64decode(
+                encoded[start:start + CHUNK_SIZE], validate=True)
+        except (binascii.Error, ValueError):
+            spool.close()
+            raise serializers.ValidationError('Некорректные данные base64.')
+        if len(head) < 12:
+            head += chunk[:12 - len(head)]
+        size += len(chunk)
+        if size > max_bytes:
+            spool.close()
+            raise serializers.ValidationError(
+                f'Изображение больше {max_bytes} байт.')
+        spool.write(chunk)
+
+    format = sniff_format(head)
+    if format is None:
+        spool.close()
+        raise serializers.ValidationError(
+            'Неподдерживаемый формат изображения.')
+    try:
+        spool.seek(0)
+        with Image.open(spool) as image:
+            width, height = image.size
+            if width * height > max_pixels:
+                raise serializers.ValidationError(
+                    f'Изображение больше {max_pixels} пикселей.')
+            image.verify()
+    except serializers.ValidationError:
+        spool.close()
+        raise
+    except Exception:
+        spool.close()
+        raise serializers.ValidationError('Файл не является изображением.')
+    spool.seek(0)
+    return UploadedFile(file=spool, name=f'temp.{format}',
+                        content_type=f'image/{format}', size=size)
+
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS)
+        return _executor
+
+
+def schedule_derivatives(recipe):
+    """Ставит в очередь пересчет уменьшенных копий изображения рецепта.
+
+    Копии строятся в пуле процессов после коммита транзакции, а до их
+    готовности сериализатор отдает ссылку на оригинал.
+    """
+    source = recipe.image.name if recipe.image else ''
+    if source == recipe.image_derivatives.get('source', ''):
+        return
+    if not source:
+        save_derivatives(recipe.pk, source, {})
+        return
+    try:
+        source_path = default_storage.path(source)
+    except NotImplementedError:
+        return
+    sizes = settings.IMAGE_DERIVATIVES
+    pk = recipe.pk
+
+    def submit():
+        if not settings.IMAGE_DERIVATIVE_WORKERS:
+            save_derivatives(pk, source,
+                             render_derivatives(source_path, sizes))
+            return
+        future = get_executor().submit(
+            render_derivatives, source_path, sizes)
+        future.add_done_callback(
+            lambda done: derivatives_ready(pk, source, done))
+
+    transaction.on_commit(submit)
+
+
+def derivatives_ready(pk, source, future):
+    try:
+        save_derivatives(pk, source, future.result())
+    except Exception:
+        logger.exception('Не удалось построить копии изображения %s', source)
+    finally:
+        connections.close_all()
+
+
+def save_derivatives(pk, source, paths):
+    from recipes.models import Recipe
+
+    root = default_storage.path('')
+    derivatives = {
+        name: os.path.relpath(path, root).replace(os.sep, '/')
+        for name, path in paths.items()
+    }
+    derivatives['source'] = source
+    recipes = Recipe.objects.filter(pk=pk)
+    previous = recipes.values_list('image_derivatives', flat=True).first()
+    # update() не вызывает post_save, поэтому версию таблицы для ETag
+    # и кэша счетчиков нужно поднять явно.
+    if not recipes.filter(image=source).update(
+            image_derivatives=derivatives, updated_at=timezone.now()):
+        return
+    bump_table_versions(Recipe)
+    # Копии замененного изображения больше никому не нужны.
+    for name, path in (previous or {}).items():
+        if name != 'source' and path not in derivatives.values():
+            default_storage.delete(path)
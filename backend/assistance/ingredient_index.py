@@ -0,0 +1,74 @@
+from bisect import bisect_left
+from threading import Lock
+
+from recipes.models import Ingredient
+from .versioning import get_version
+
+INGREDIENTS_VERSION = 'ingredients'
+
+
+def normalize(name):
+    return name.strip().lower().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Отсортированный по нормализованному названию индекс ингредиентов.
+
+    Индекс строится один раз на процесс и перестраивается, когда меняется
+    версия ингредиентов, поэтому поиск не обращается к базе данных.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        # (keys, rows, ordered) публикуются одним присваиванием: поиск
+        # читает их без блокировки и не должен смешать старое с новым.
+        self._state = ([], [], [])
+
+    def _refresh(self):
+        version = get_version(INGREDIENTS_VERSION)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            rows = [
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for pk, name, unit in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit')
+            ]
+            entries = sorted(
+                ((normalize(row['name']), row) for row in rows),
+                key=lambda entry: (entry[0], entry[1]['id'])
+            )
+            self._state = (
+                [key for key, _ in entries],
+                [row for _, row in entries],
+                sorted(rows, key=lambda row: (row['name'], row['id'])))
+            self._version = version
+
+    def all(self):
+        self._refresh()
+        return self._state[2]
+
+    def search(self, query, limit=None):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        self._refresh()
+        query = normalize(query)
+        keys, rows, _ = self._state
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = rows[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        for index, key in enumerate(keys):
+            if query in key and not start <= index < end:
+                result.append(rows[index])
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,109 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import (http_date, parse_etags,
+                               parse_http_date_safe, quote_etag)
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .versioning import get_version, table_version_name
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list и retrieve.
+
+    Версии коллекций берутся из счетчиков таблиц, которые увеличиваются
+    при каждой записи, поэтому на неизменившиеся данные ответ 304
+    отдается до выборки и сериализации.
+    """
+    etag_models = ()
+    etag_per_user = True
+
+    def table_versions(self, exclude=()):
+        return [
+            get_version(table_version_name(model._meta.db_table))
+            for model in self.etag_models
+            if model not in exclude
+        ]
+
+    def make_etag(self, request, *parts):
+        user_id = None
+        if self.etag_per_user and not request.user.is_anonymous:
+            user_id = request.user.pk
+        signature = repr((request.get_full_path(), user_id) + parts)
+        return hashlib.md5(signature.encode()).hexdigest()
+
+    def collection_validators(self, request):
+        return self.make_etag(request, self.table_versions()), None
+
+    def object_validators(self, request):
+        return self.collection_validators(request)
+
+    def conditional(self, request, validators, handler, *args, **kwargs):
+        etag, last_modified = validators
+        if etag is not None:
+            etag = quote_etag(etag)
+        if self.not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        if self.etag_per_user:
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    @staticmethod
+    def not_modified(request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            return etag is not None and ('*' in etags or etag in etags)
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return (last_modified is not None and if_modified_since is not None
+                and int(last_modified.timestamp()) <= if_modified_since)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(
+            request, self.collection_validators(request),
+            super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            request, self.object_validators(request),
+            super().retrieve, *args, **kwargs)
+
+
+class CachedListMixin:
+    """Кэширует готовый JSON списка до следующей записи в его таблицы.
+
+    Ключ строится так же, как ETag из ConditionalGetMixin, поэтому
+    сигналы сохранения и удаления моделей сбрасывают и то и другое.
+    """
+    list_cache_key = 'list:{}'
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        key = self.list_cache_key.format(
+            self.make_etag(request, self.table_versions()))
+        content = cache.get(key)
+        if content is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = JSONRenderer().render(response.data)
+            cache.set(key, content, settings.REFERENCE_CACHE_TIMEOUT)
+        return HttpResponse(content, content_type='application/json')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
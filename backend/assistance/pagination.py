@@ -1,10 +1,110 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField, F, Func, Value
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (CursorPagination,
+                                       LimitOffsetPagination,
+                                       PageNumberPagination,
+                                       _reverse_ordering)
 from rest_framework.response import Response
 
+from .versioning import get_version, table_version_name
+
+COUNT_KEY = 'count:{}'
+
+# Фрагменты SQL, за которыми стоят данные других таблиц: например,
+# полнотекстовый индекс рецептов обновляется триггерами. Ключ кэша
+# счетчика учитывает версии перечисленных таблиц.
+count_dependencies = {}
+
+
+def estimated_count(queryset):
+    """Число строк таблицы по статистике планировщика без COUNT(*).
+
+    Статистику собирают ANALYZE и autovacuum. Если ее еще нет, оценки
+    тоже нет, и cached_count считает строки точно.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # До первого ANALYZE reltuples равен -1 (0 в старых версиях).
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass AND reltuples > 0', [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # Первое число в stat — оценка числа строк таблицы.
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def cached_count(queryset):
+    """COUNT(*) с кэшем по сигнатуре запроса.
+
+    В ключ входят версии всех таблиц, упомянутых в запросе, поэтому любая
+    запись в них делает закэшированное значение недействительным.
+    Для запросов без фильтров над большими таблицами можно вернуть
+    оценку, см. PAGINATION_ESTIMATE_THRESHOLD.
+    """
+    threshold = settings.PAGINATION_ESTIMATE_THRESHOLD
+    if threshold is not None and not queryset.query.where:
+        estimate = estimated_count(queryset)
+        if estimate is not None and estimate >= threshold:
+            return estimate
+
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    quote = connections[queryset.db].ops.quote_name
+    tables = {
+        model._meta.db_table for model in apps.get_models()
+        if quote(model._meta.db_table) in sql
+    }
+    for fragment, sources in count_dependencies.items():
+        if fragment in sql:
+            tables.update(sources)
+    tables = sorted(tables)
+    versions = [get_version(table_version_name(table)) for table in tables]
+    signature = hashlib.md5(
+        repr((queryset.db, sql, params, versions)).encode()).hexdigest()
+    key = COUNT_KEY.format(signature)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.PAGINATION_COUNT_TIMEOUT)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_query_param = 'page'
+    django_paginator_class = CachedCountPaginator
 
     def get_paginated_response(self, data):
         return Response({
@@ -13,3 +113,151 @@ class CustomPagination(PageNumberPagination):
             'count': self.page.paginator.count,
             'results': data
         })
+
+
+class RowCompare(Func):
+    """Сравнение кортежей (a, b, c) < (x, y, z) одним условием.
+
+    В отличие от развернутого OR такое условие база читает как границу
+    диапазона составного индекса.
+    """
+    output_field = BooleanField()
+
+    def __init__(self, fields, values, operator):
+        self.operator = operator
+        super().__init__(*(F(name) for name in fields), *values)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sqls, params = [], []
+        for expression in self.source_expressions:
+            sql, expression_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(expression_params)
+        size = len(sqls) // 2
+        return '({}) {} ({})'.format(
+            ', '.join(sqls[:size]), self.operator,
+            ', '.join(sqls[size:])), params
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Постраничный обход по составному ключу без OFFSET и COUNT(*).
+
+    Позиция курсора хранит значения всех полей сортировки, а не только
+    первого, как в CursorPagination, поэтому на равных favorites_count
+    страницы не переходят на OFFSET. Все поля сортировки должны идти
+    в одном направлении и заканчиваться уникальным id.
+    """
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'get_ordering', lambda: None)()
+        return ordering or super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        ordering = self.ordering
+        if reverse:
+            ordering = _reverse_ordering(ordering)
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            operator = '<' if ordering[0].startswith('-') else '>'
+            fields = [field.lstrip('-') for field in ordering]
+            queryset = queryset.filter(RowCompare(
+                fields, self.position_values(queryset.model, fields,
+                                             current_position), operator))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def position_values(self, model, fields, position):
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            return [
+                Value(field.to_python(value), output_field=field)
+                for field, value in zip(
+                    (model._meta.get_field(name) for name in fields), values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([
+            str(getattr(instance, field.lstrip('-'))) for field in ordering
+        ])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'count': None,
+            'results': data
+        })
+
+
+class RecipePagination(LimitOffsetPagination):
+    """Limit/offset по умолчанию, ключевая пагинация по ?pagination=cursor.
+
+    Ссылки next/previous в режиме курсора содержат параметр cursor,
+    поэтому клиенту достаточно включить режим на первой странице.
+    """
+    mode_query_param = 'pagination'
+    cursor_pagination_class = RecipeCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_pagination_class.cursor_query_param
+                in request.query_params):
+            self.cursor = self.cursor_pagination_class()
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset):
+        return cached_count(queryset)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
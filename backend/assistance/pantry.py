@@ -0,0 +1,103 @@
+import heapq
+from array import array
+from collections import defaultdict
+from threading import Lock
+
+from recipes.models import AmountOfIngredient
+from .versioning import get_changes, get_version
+
+PANTRY_VERSION = 'pantry'
+
+
+class PantryIndex:
+    """Обратный индекс ингредиент -> рецепты для подбора по продуктам.
+
+    Индекс живет в памяти процесса. При изменении рецепта в журнал версии
+    pantry записывается его id, и индекс перечитывает только эти рецепты;
+    если журнал неполон, индекс строится заново.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        # (postings, recipes) публикуются одним присваиванием: match()
+        # читает их без блокировки и не должен увидеть половину
+        # обновления.
+        self._state = ({}, {})
+
+    def _refresh(self):
+        version = get_version(PANTRY_VERSION)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            changes = get_changes(PANTRY_VERSION, self._version, version)
+            if changes is None:
+                self._build()
+            else:
+                self._update(set(changes))
+            self._version = version
+
+    def _build(self):
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in AmountOfIngredient.objects.values_list(
+                'recipe_id', 'ingredient_id').iterator():
+            recipes[recipe_id].append(ingredient_id)
+        postings = defaultdict(lambda: array('q'))
+        for recipe_id, ingredients in recipes.items():
+            for ingredient_id in ingredients:
+                postings[ingredient_id].append(recipe_id)
+        self._state = (dict(postings), {
+            recipe_id: tuple(ingredients)
+            for recipe_id, ingredients in recipes.items()
+        })
+
+    def _update(self, recipe_ids):
+        postings, recipes = self._state
+        postings, recipes = dict(postings), dict(recipes)
+        affected = set()
+        for recipe_id in recipe_ids:
+            affected.update(recipes.pop(recipe_id, ()))
+        added = defaultdict(list)
+        fresh = defaultdict(list)
+        for recipe_id, ingredient_id in AmountOfIngredient.objects.filter(
+                recipe_id__in=recipe_ids).values_list(
+                    'recipe_id', 'ingredient_id'):
+            fresh[recipe_id].append(ingredient_id)
+            added[ingredient_id].append(recipe_id)
+        for recipe_id, ingredients in fresh.items():
+            recipes[recipe_id] = tuple(ingredients)
+        # Массивы старого состояния могут читать другие потоки, поэтому
+        # измененные списки собираются заново, а не дополняются.
+        for ingredient_id in affected | set(added):
+            posting = array('q', (
+                pk for pk in postings.get(ingredient_id, ())
+                if pk not in recipe_ids))
+            posting.extend(added.get(ingredient_id, ()))
+            postings[ingredient_id] = posting
+        self._state = (postings, recipes)
+
+    def match(self, ingredient_ids, limit):
+        """Лучшие рецепты по доле имеющихся ингредиентов.
+
+        Возвращает список (recipe_id, matched, missing), отсортированный по
+        убыванию покрытия и возрастанию числа недостающих ингредиентов.
+        """
+        self._refresh()
+        postings, recipes = self._state
+        matched = defaultdict(int)
+        for ingredient_id in set(ingredient_ids):
+            for recipe_id in postings.get(ingredient_id, ()):
+                matched[recipe_id] += 1
+        best = heapq.nlargest(
+            limit, matched.items(),
+            key=lambda item: (item[1] / len(recipes[item[0]]),
+                              -len(recipes[item[0]]), item[0]))
+        return [
+            (recipe_id, count, len(recipes[recipe_id]) - count)
+            for recipe_id, count in best
+        ]
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,63 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .pagination import count_dependencies
+
+WORD = re.compile(r'\w+', re.UNICODE)
+SEARCH_CONFIG = 'russian'
+SEARCH_SOURCES = ('recipes_recipe', 'recipes_amountofingredient',
+                  'recipes_ingredient')
+
+count_dependencies.update({
+    'recipes_recipe_fts': SEARCH_SOURCES,
+    'search_vector': SEARCH_SOURCES,
+})
+
+
+def search_terms(query):
+    return WORD.findall(query.lower().replace('ё', 'е'))[:16]
+
+
+def search_recipes(recipes, query):
+    """Полнотекстовый поиск по названию, описанию и ингредиентам.
+
+    Отбор идет по индексу движка: FTS5 в SQLite и GIN по tsvector в
+    PostgreSQL. Каждое слово ищется как префикс, результат упорядочен по
+    релевантности в аннотации search_rank.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return recipes.none()
+    vendor = connections[recipes.db].vendor
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matched = RawSQL(
+            'SELECT rowid FROM recipes_recipe_fts '
+            'WHERE recipes_recipe_fts MATCH %s', (match,))
+        rank = RawSQL(
+            'SELECT -bm25(recipes_recipe_fts, 10.0, 1.0, 5.0) '
+            'FROM recipes_recipe_fts '
+            'WHERE recipes_recipe_fts MATCH %s '
+            'AND rowid = recipes_recipe.id', (match,),
+            output_field=FloatField())
+    elif vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        matched = RawSQL(
+            'SELECT id FROM recipes_recipe '
+            'WHERE search_vector @@ to_tsquery(%s, %s)',
+            (SEARCH_CONFIG, tsquery))
+        rank = RawSQL(
+            'ts_rank(recipes_recipe.search_vector, to_tsquery(%s, %s))',
+            (SEARCH_CONFIG, tsquery), output_field=FloatField())
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= (Q(name__icontains=term) | Q(text__icontains=term)
+                          | Q(ingredients__name__icontains=term))
+        return recipes.filter(pk__in=recipes.model.objects.filter(
+            condition).values('pk'))
+    return recipes.filter(pk__in=matched).annotate(
+        search_rank=rank).order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,156 @@
+# Триггеры и таблица полнотекстового индекса, созданные миграцией 0007,
+# для проверки и ремонта командой rebuild_search_index. Миграции хранят
+# собственную копию SQL: изменения схемы поиска выпускаются новыми
+# миграциями, а этот модуль приводится в соответствие с ними.
+#
+# SQLite выполняет часть изменений схемы (AddField, AlterField) через
+# пересоздание таблицы, и триггеры recipes_recipe при этом пропадают.
+# Миграции, меняющей схему Recipe, нужно пересоздать их, как 0013.
+
+
+def fold_yo(column):
+    """Поиск не различает е и ё, как и индекс ингредиентов."""
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+INGREDIENT_NAMES = '''
+    SELECT {aggregate}
+    FROM recipes_amountofingredient AS a
+    JOIN recipes_ingredient AS i ON i.id = a.ingredient_id
+    WHERE a.recipe_id = {recipe}
+'''
+
+SQLITE_NAMES = INGREDIENT_NAMES.format(
+    aggregate=f"group_concat({fold_yo('i.name')}, ' ')", recipe='{}')
+
+SQLITE_FILL = [
+    'DELETE FROM recipes_recipe_fts',
+    '''INSERT INTO recipes_recipe_fts(rowid, name, text, ingredients)
+       SELECT r.id, {}, {}, COALESCE(({}), '')
+       FROM recipes_recipe AS r'''.format(
+        fold_yo('r.name'), fold_yo('r.text'), SQLITE_NAMES.format('r.id')),
+]
+
+SQLITE_RECIPE_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert
+       AFTER INSERT ON recipes_recipe BEGIN
+           INSERT INTO recipes_recipe_fts(rowid, name, text, ingredients)
+           VALUES (new.id, {}, {}, '');
+       END'''.format(fold_yo('new.name'), fold_yo('new.text')),
+    '''CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update
+       AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+           UPDATE recipes_recipe_fts SET name = {}, text = {}
+           WHERE rowid = new.id;
+       END'''.format(fold_yo('new.name'), fold_yo('new.text')),
+    '''CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete
+       AFTER DELETE ON recipes_recipe BEGIN
+           DELETE FROM recipes_recipe_fts WHERE rowid = old.id;
+       END''',
+]
+
+SQLITE_RELATED_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS recipes_amount_fts_insert
+       AFTER INSERT ON recipes_amountofingredient BEGIN
+           UPDATE recipes_recipe_fts
+           SET ingredients = COALESCE(({}), '')
+           WHERE rowid = new.recipe_id;
+       END'''.format(SQLITE_NAMES.format('new.recipe_id')),
+    '''CREATE TRIGGER IF NOT EXISTS recipes_amount_fts_delete
+       AFTER DELETE ON recipes_amountofingredient BEGIN
+           UPDATE recipes_recipe_fts
+           SET ingredients = COALESCE(({}), '')
+           WHERE rowid = old.recipe_id;
+       END'''.format(SQLITE_NAMES.format('old.recipe_id')),
+    '''CREATE TRIGGER IF NOT EXISTS recipes_ingredient_fts_update
+       AFTER UPDATE OF name ON recipes_ingredient BEGIN
+           UPDATE recipes_recipe_fts
+           SET ingredients = COALESCE(({}), '')
+           WHERE rowid IN (
+               SELECT recipe_id FROM recipes_amountofingredient
+               WHERE ingredient_id = new.id
+           );
+       END'''.format(SQLITE_NAMES.format('recipes_recipe_fts.rowid')),
+]
+
+SQLITE_TRIGGER_NAMES = (
+    'recipes_recipe_fts_insert', 'recipes_recipe_fts_update',
+    'recipes_recipe_fts_delete', 'recipes_amount_fts_insert',
+    'recipes_amount_fts_delete', 'recipes_ingredient_fts_update',
+)
+
+POSTGRESQL_VECTOR = '''
+    setweight(to_tsvector('russian', {}), 'A')
+    || setweight(to_tsvector('russian', COALESCE(({}), '')), 'B')
+    || setweight(to_tsvector('russian', {}), 'C')
+'''.format(
+    fold_yo('r.name'),
+    INGREDIENT_NAMES.format(
+        aggregate=f"string_agg({fold_yo('i.name')}, ' ')", recipe='r.id'),
+    fold_yo('r.text'))
+
+POSTGRESQL_FILL = [
+    'SELECT recipes_recipe_search_refresh(id) FROM recipes_recipe',
+]
+
+POSTGRESQL_RECIPE_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS recipes_recipe_search ON recipes_recipe',
+    '''CREATE TRIGGER recipes_recipe_search
+       AFTER INSERT OR UPDATE OF name, text ON recipes_recipe
+       FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_trigger()''',
+]
+
+POSTGRESQL_TRIGGER_NAMES = (
+    'recipes_recipe_search', 'recipes_amount_search',
+    'recipes_ingredient_search',
+)
+
+RESTORE = {
+    'sqlite': SQLITE_RECIPE_TRIGGERS + SQLITE_RELATED_TRIGGERS + SQLITE_FILL,
+    'postgresql': POSTGRESQL_RECIPE_TRIGGERS + POSTGRESQL_FILL,
+}
+
+
+def restore_search_index(connection):
+    """Пересоздает недостающие триггеры и заново заполняет индекс."""
+    with connection.cursor() as cursor:
+        for statement in RESTORE.get(connection.vendor, ()):
+            cursor.execute(statement)
+
+
+SQLITE_DRIFT = '''
+    SELECT (
+        SELECT count(*) FROM recipes_recipe AS r
+        LEFT JOIN recipes_recipe_fts AS f ON f.rowid = r.id
+        WHERE f.rowid IS NULL OR f.name IS NOT {} OR f.text IS NOT {}
+            OR f.ingredients IS NOT COALESCE(({}), '')
+    ) + (
+        SELECT count(*) FROM recipes_recipe_fts
+        WHERE rowid NOT IN (SELECT id FROM recipes_recipe)
+    )
+'''.format(fold_yo('r.name'), fold_yo('r.text'), SQLITE_NAMES.format('r.id'))
+
+POSTGRESQL_DRIFT = '''
+    SELECT count(*) FROM recipes_recipe AS r
+    WHERE r.search_vector IS DISTINCT FROM ({})
+'''.format(POSTGRESQL_VECTOR)
+
+DRIFT = {
+    'sqlite': (SQLITE_DRIFT, SQLITE_TRIGGER_NAMES,
+               "SELECT name FROM sqlite_master WHERE type = 'trigger'"),
+    'postgresql': (POSTGRESQL_DRIFT, POSTGRESQL_TRIGGER_NAMES,
+                   'SELECT tgname FROM pg_trigger WHERE NOT tgisinternal'),
+}
+
+
+def search_index_drift(connection):
+    """Недостающие триггеры и число строк индекса, разошедшихся с
+    recipes_recipe: ([имя триггера], число строк)."""
+    if connection.vendor not in DRIFT:
+        return [], 0
+    drift, names, triggers = DRIFT[connection.vendor]
+    with connection.cursor() as cursor:
+        cursor.execute(triggers)
+        existing = {name for name, in cursor.fetchall()}
+        cursor.execute(drift)
+        rows, = cursor.fetchone()
+    return [name for name in names if name not in existing], rows
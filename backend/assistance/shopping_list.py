@@ -0,0 +1,147 @@
+import csv
+import json
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from recipes.models import ShoppingListItem
+
+FILENAME = 'shopping_list'
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Делает формат доступным для ?format=; ошибки отдаются как JSON."""
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class PdfRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+class TextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CsvRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JsonRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+
+SHOPPING_LIST_RENDERERS = (PdfRenderer, TextRenderer, CsvRenderer,
+                           JsonRenderer)
+
+
+def shopping_list(user):
+    """Суммарное количество каждого ингредиента из корзины пользователя."""
+    return ShoppingListItem.objects.filter(
+        user=user, amount__gt=0
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
+def _rows(user):
+    for row in shopping_list(user).iterator():
+        yield (row['ingredient__name'],
+               row['ingredient__measurement_unit'],
+               row['amount'])
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def iter_txt(user):
+    for name, unit, amount in _rows(user):
+        yield f'{name} ({unit}) — {amount}\n'
+
+
+def iter_csv(user):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in _rows(user):
+        yield writer.writerow(row)
+
+
+def iter_json(user):
+    separator = '['
+    for name, unit, amount in _rows(user):
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': amount},
+            ensure_ascii=False)
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+def build_pdf(user):
+    """Собирает постраничный PDF во временный файл.
+
+    В отличие от остальных форматов PDF не отдается по мере выборки:
+    ReportLab держит страницы документа до save(), а таблицу смещений
+    объектов записывает в конец файла, поэтому первый байт появляется
+    только после последней страницы. Готовый файл больше
+    SHOPPING_LIST_PDF_SPOOL_SIZE уходит на диск, а ответ читает его
+    кусками.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.pdfgen import canvas
+
+    buffer = SpooledTemporaryFile(
+        max_size=settings.SHOPPING_LIST_PDF_SPOOL_SIZE)
+    pdf = canvas.Canvas(buffer, pagesize=letter, bottomup=0)
+    font_size = 14
+    leading = font_size * 1.2
+    bottom = letter[1] - inch
+    text = None
+    for name, unit, amount in _rows(user):
+        if text is None or text.getY() + leading > bottom:
+            if text is not None:
+                pdf.drawText(text)
+                pdf.showPage()
+            text = pdf.beginText()
+            text.setTextOrigin(inch, inch)
+            text.setFont('Helvetica', font_size, leading)
+        text.textLine(f'{name} ({unit}) - {amount}')
+    if text is not None:
+        pdf.drawText(text)
+    pdf.showPage()
+    pdf.save()
+    buffer.seek(0)
+    return buffer
+
+
+STREAMS = {'txt': iter_txt, 'csv': iter_csv, 'json': iter_json}
+
+
+def shopping_list_response(user, format):
+    if format == 'pdf':
+        return FileResponse(build_pdf(user), as_attachment=True,
+                            filename=f'{FILENAME}.pdf',
+                            content_type=PdfRenderer.media_type)
+    renderer = {r.format: r for r in SHOPPING_LIST_RENDERERS}[format]
+    response = StreamingHttpResponse(
+        STREAMS[format](user),
+        content_type=f'{renderer.media_type}; charset=utf-8')
+    response['Content-Disposition'] = (
+        f'attachment; filename="{FILENAME}.{format}"')
+    return response
@@ -0,0 +1,48 @@
+from django.apps import apps
+from django.db.models import CASCADE
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .versioning import bump_table_versions
+
+# Таблицы, версии которых входят в ETag, ключи кэша списков и счетчиков.
+VERSIONED_MODELS = ('users.User', 'recipes.Tag', 'recipes.Ingredient',
+                    'recipes.Recipe', 'recipes.Follow')
+# Строки рецепта удаляются каскадом вместе с ним. Обработчик post_delete
+# на этих моделях отключил бы быстрое удаление одним DELETE, поэтому их
+# версии поднимает удаление родителя, а массовые изменения — явно.
+CASCADED_MODELS = ('recipes.Favorite', 'recipes.Cart',
+                   'recipes.AmountOfIngredient', 'recipes.Recipe_tags')
+
+
+def cascaded_models(model):
+    """Отслеживаемые модели, строки которых удаляются вместе с model."""
+    tracked = {apps.get_model(label) for label in CASCADED_MODELS}
+    return [
+        field.related_model
+        for field in model._meta.get_fields(include_hidden=True)
+        if field.one_to_many and field.auto_created
+        and field.on_delete is CASCADE and field.related_model in tracked
+    ]
+
+
+def table_saved(sender, using, **kwargs):
+    bump_table_versions(sender, using=using)
+
+
+def table_deleted(sender, using, **kwargs):
+    bump_table_versions(sender, *cascaded_models(sender), using=using)
+
+
+def tags_changed(sender, action, using, **kwargs):
+    if action.startswith('post_'):
+        bump_table_versions(sender, using=using)
+
+
+for label in VERSIONED_MODELS + CASCADED_MODELS:
+    post_save.connect(table_saved, sender=label,
+                      dispatch_uid=f'assistance.table_saved.{label}')
+for label in VERSIONED_MODELS:
+    post_delete.connect(table_deleted, sender=label,
+                        dispatch_uid=f'assistance.table_deleted.{label}')
+m2m_changed.connect(tags_changed, sender='recipes.Recipe_tags',
+                    dispatch_uid='assistance.tags_changed')
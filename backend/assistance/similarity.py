@@ -0,0 +1,103 @@
+import hashlib
+import random
+import struct
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import (AmountOfIngredient, Recipe, RecipeBucket,
+                            RecipeSignature)
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+MAX_CANDIDATES = 500
+PRIME = (1 << 61) - 1
+
+# Коэффициенты фиксированы, чтобы сигнатуры совпадали между процессами
+# и запусками.
+_random = random.Random(20231018)
+COEFFICIENTS = tuple(
+    (_random.randrange(1, PRIME), _random.randrange(0, PRIME))
+    for _ in range(NUM_HASHES)
+)
+SIGNATURE_FORMAT = f'<{NUM_HASHES}Q'
+
+
+def minhash(features):
+    return [
+        min((a * feature + b) % PRIME for feature in features)
+        for a, b in COEFFICIENTS
+    ]
+
+
+def band_hashes(signature):
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            struct.pack(f'<{ROWS}Q', *rows), digest_size=8).digest()
+        yield band, int.from_bytes(digest, 'little', signed=True)
+
+
+def similarity(first, second):
+    """Оценка коэффициента Жаккара по двум сигнатурам."""
+    return sum(a == b for a, b in zip(first, second)) / NUM_HASHES
+
+
+def recipe_features(recipe_ids):
+    """Ингредиенты (четные коды) и тэги (нечетные коды) рецептов."""
+    features = defaultdict(set)
+    for recipe_id, ingredient_id in AmountOfIngredient.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient_id'):
+        features[recipe_id].add(2 * ingredient_id)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids).values_list('recipe_id', 'tag_id'):
+        features[recipe_id].add(2 * tag_id + 1)
+    return features
+
+
+def index_recipes(recipe_ids):
+    """Пересчитывает сигнатуры и корзины LSH для рецептов."""
+    recipe_ids = list(recipe_ids)
+    signatures, buckets = [], []
+    for recipe_id, features in recipe_features(recipe_ids).items():
+        signature = minhash(features)
+        signatures.append(RecipeSignature(
+            recipe_id=recipe_id,
+            minhash=struct.pack(SIGNATURE_FORMAT, *signature)))
+        buckets.extend(
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for band, bucket in band_hashes(signature))
+    with transaction.atomic():
+        RecipeBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSignature.objects.bulk_create(signatures)
+        RecipeBucket.objects.bulk_create(buckets)
+
+
+def similar_recipes(recipe_id, limit):
+    """Похожие рецепты: [(recipe_id, similarity)] по убыванию сходства.
+
+    Кандидаты берутся только из общих корзин LSH, поэтому стоимость
+    поиска не растет вместе с каталогом.
+    """
+    signature = RecipeSignature.objects.filter(
+        recipe_id=recipe_id).values_list('minhash', flat=True).first()
+    if signature is None:
+        return []
+    signature = struct.unpack(SIGNATURE_FORMAT, bytes(signature))
+    same_bucket = Q()
+    for band, bucket in band_hashes(signature):
+        same_bucket |= Q(band=band, bucket=bucket)
+    candidates = RecipeBucket.objects.filter(same_bucket).exclude(
+        recipe_id=recipe_id).values('recipe_id').distinct()[:MAX_CANDIDATES]
+    scores = [
+        (candidate, similarity(
+            signature, struct.unpack(SIGNATURE_FORMAT, bytes(minhash))))
+        for candidate, minhash in RecipeSignature.objects.filter(
+            recipe_id__in=candidates).values_list('recipe_id', 'minhash')
+    ]
+    scores.sort(key=lambda item: (-item[1], -item[0]))
+    return scores[:limit]
@@ -0,0 +1,25 @@
+from PIL import Image, ImageOps
+
+# Модуль выполняется в процессах пула и намеренно не импортирует Django.
+
+
+def render_derivatives(source_path, sizes):
+    """Сохраняет рядом с оригиналом уменьшенные копии в JPEG и WebP.
+
+    Имя копии включает полное имя оригинала: temp.gif и temp.webp
+    в одном каталоге не должны делить одну копию. Возвращает словарь
+    {имя копии: путь к файлу}.
+    """
+    paths = {}
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+        for name, width in sizes.items():
+            copy = image.copy()
+            copy.thumbnail((width, width * 4), Image.LANCZOS)
+            jpeg_path = f'{source_path}.{name}.jpg'
+            webp_path = f'{source_path}.{name}.webp'
+            copy.save(jpeg_path, 'JPEG', quality=85, optimize=True)
+            copy.save(webp_path, 'WEBP', quality=80, method=4)
+            paths[name] = jpeg_path
+            paths[f'{name}_webp'] = webp_path
+    return paths
@@ -1,24 +1,190 @@
+import sqlite3
+
 from rest_framework import status
 from rest_framework.response import Response
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import (BooleanField, Count, Exists, F, Max,
+                              OuterRef, Prefetch, Subquery, Value)
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 
-from recipes.models import Recipe
+from recipes.models import Cart, Favorite, Recipe, Tag
+from users.models import User
+from .cart_totals import cart_changed
+from .versioning import bump_table_versions, get_version, table_version_name
+
+TAG_SLUGS_KEY = 'tag_slugs:{}'
+
+COUNTERS = {Favorite: 'favorites_count', Cart: 'carts_count'}
+
+
+def returning_supported():
+    """Умеет ли база вернуть затронутые строки через RETURNING."""
+    if connection.vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'postgresql'
+
+
+def change_selection(model, user_id, recipe_ids, add):
+    """Добавляет рецепты в избранное или корзину (add) либо убирает их.
+
+    Строки вставляются или удаляются одним запросом, дубликаты и
+    несуществующие рецепты пропускаются. Возвращает id рецептов,
+    которые действительно добавлены или удалены.
+    """
+    recipe_ids = sorted(set(recipe_ids))
+    if not recipe_ids:
+        return []
+    meta = model._meta
+    quote = connection.ops.quote_name
+    names = {
+        'table': quote(meta.db_table),
+        'user': quote(meta.get_field('user').column),
+        'recipe': quote(meta.get_field('recipe').column),
+        'recipes': quote(Recipe._meta.db_table),
+        'pk': quote(Recipe._meta.pk.column),
+        'ids': ', '.join(['%s'] * len(recipe_ids)),
+    }
+    if add:
+        sql = '{} {table} ({user}, {recipe}) SELECT %s, {pk} FROM {recipes} ' \
+              'WHERE {pk} IN ({ids}){}'.format(
+                  connection.ops.insert_statement(ignore_conflicts=True),
+                  connection.ops.ignore_conflicts_suffix_sql(
+                      ignore_conflicts=True), **names)
+    else:
+        sql = 'DELETE FROM {table} WHERE {user} = %s ' \
+              'AND {recipe} IN ({ids})'.format(**names)
+    params = [user_id, *recipe_ids]
+    selected = model.objects.filter(
+        user_id=user_id, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if returning_supported():
+            cursor.execute(
+                '{} RETURNING {recipe}'.format(sql, **names), params)
+            changed = [recipe_id for recipe_id, in cursor.fetchall()]
+        else:
+            before = set(selected)
+            cursor.execute(sql, params)
+            changed = list(set(selected.all()) - before if add else before)
+        if changed:
+            counter = COUNTERS[model]
+            sign = 1 if add else -1
+            Recipe.objects.filter(id__in=changed).update(
+                **{counter: F(counter) + sign})
+            if model is Cart:
+                cart_changed(user_id, changed, sign)
+            bump_table_versions(model)
+    return sorted(changed)
 
 
 def favorite_or_cart(self, model, id):
-    objects = model.objects.filter(
-        user=self.request.user,
-        recipe=get_object_or_404(Recipe, id=id))
-
-    fav_flag = objects.exists()
-    if self.request.method == "POST":
-        if fav_flag:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-
-        model.objects.create(user=self.request.user,
-                             recipe=get_object_or_404(Recipe, id=id))
-        return Response(status=status.HTTP_201_CREATED)
-    if not fav_flag:
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-    objects.delete()
-    return Response(status=status.HTTP_204_NO_CONTENT)
+    try:
+        id = int(id)
+    except ValueError:
+        raise Http404
+    add = self.request.method == "POST"
+    if change_selection(model, self.request.user.id, (id,), add):
+        return Response(status=status.HTTP_201_CREATED if add
+                        else status.HTTP_204_NO_CONTENT)
+    get_object_or_404(Recipe, id=id)
+    return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+def get_recipes_limit(request):
+    """Возвращает recipes_limit из запроса или None, если он не задан."""
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit > 0 else None
+
+
+def limited_recipes(authors_recipes, recipes_limit):
+    """Оставляет не больше recipes_limit свежих рецептов каждого автора.
+
+    Номер рецепта внутри автора считается оконной функцией ROW_NUMBER,
+    поэтому рецепты всех авторов страницы грузятся одним запросом.
+    """
+    recipes = Recipe.objects.only(
+        'id', 'author_id', 'name', 'image', 'cooking_time', 'pub_date')
+    if recipes_limit is None:
+        return recipes
+    ranked = authors_recipes.annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author')],
+            order_by=F('pub_date').desc()
+        )
+    ).values('id', 'row_number')
+    sql, params = ranked.query.sql_with_params()
+    return recipes.filter(pk__in=RawSQL(
+        f'SELECT "id" FROM ({sql}) ranked WHERE "row_number" <= %s',
+        (*params, recipes_limit)
+    ))
+
+
+def subscriptions_queryset(user, recipes_limit=None):
+    """Авторы, на которых подписан user, вместе с их последними рецептами."""
+    recipes = limited_recipes(
+        Recipe.objects.filter(author__following__user=user), recipes_limit)
+    # Число рецептов считается подзапросом по индексу автора, а порядок
+    # берется из индекса подписок (user, following): без GROUP BY и
+    # сортировки во временной таблице.
+    return User.objects.filter(following__user=user).annotate(
+        recipes_count=Coalesce(Subquery(
+            Recipe.objects.filter(author=OuterRef('pk')).order_by().values(
+                'author').annotate(total=Count('pk')).values('total')
+        ), 0),
+        is_subscribed=Value(True, output_field=BooleanField())
+    ).prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+    ).order_by('following__following_id')
+
+
+def tag_ids_by_slug():
+    """Словарь slug -> id тэгов, закэшированный до изменения тэгов."""
+    key = TAG_SLUGS_KEY.format(
+        get_version(table_version_name(Tag._meta.db_table)))
+    slugs = cache.get(key)
+    if slugs is None:
+        slugs = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, slugs, None)
+    return slugs
+
+
+def filter_by_tags(recipes, slugs):
+    """Рецепты хотя бы с одним из тэгов, без JOIN и DISTINCT."""
+    known = tag_ids_by_slug()
+    tag_ids = [known[slug] for slug in set(slugs) if slug in known]
+    if not tag_ids:
+        return recipes.none()
+    return recipes.filter(Exists(Recipe.tags.through.objects.filter(
+        recipe=OuterRef('pk'), tag_id__in=tag_ids)))
+
+
+def actual_counters():
+    """Подзапросы с фактическим числом добавлений рецепта по счетчикам."""
+    return {
+        counter: Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe').annotate(total=Count('pk')).values('total')
+        ), 0)
+        for model, counter in COUNTERS.items()
+    }
+
+
+def bulk_create_with_pks(model, objects):
+    """bulk_create, после которого у объектов есть pk на любой базе.
+
+    Без RETURNING (SQLite) pk выделяются от текущего максимума, поэтому
+    вызывать нужно внутри транзакции.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        first = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        for pk, instance in enumerate(objects, first):
+            instance.pk = pk
+    return model.objects.bulk_create(objects)
@@ -0,0 +1,72 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'version:{}'
+CHANGE_KEY = 'change:{}:{}'
+CHANGE_TIMEOUT = 60 * 60
+MAX_CHANGES = 1000
+
+
+def get_version(name):
+    """Текущая версия набора данных name, общая для всех процессов."""
+    return cache.get_or_set(VERSION_KEY.format(name), time.time_ns(), None)
+
+
+def bump_version(name):
+    """Увеличивает версию набора данных, сбрасывая зависящие от нее кэши."""
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def table_version_name(db_table):
+    return f'table:{db_table}'
+
+
+def bump_versions_on_commit(*names, using=None):
+    """Поднимает версии наборов данных после коммита транзакции.
+
+    Если поднять их раньше, параллельный запрос успеет прочитать старые
+    данные и сохранить их в кэше уже под новой версией.
+    """
+    def bump():
+        for name in names:
+            bump_version(name)
+
+    transaction.on_commit(bump, using=using)
+
+
+def bump_table_versions(*models, using=None):
+    """Поднимает версии таблиц моделей после коммита транзакции."""
+    bump_versions_on_commit(
+        *(table_version_name(model._meta.db_table) for model in models),
+        using=using)
+
+
+def record_change(name, payload):
+    """Увеличивает версию и запоминает, что именно изменилось."""
+    version = bump_version(name)
+    cache.set(CHANGE_KEY.format(name, version), payload, CHANGE_TIMEOUT)
+    return version
+
+
+def get_changes(name, since, until):
+    """Изменения между версиями since и until или None, если журнал неполон.
+
+    None означает, что часть записей устарела или их слишком много,
+    и данные нужно перестроить целиком.
+    """
+    if since is None or not 0 <= until - since <= MAX_CHANGES:
+        return None
+    keys = [CHANGE_KEY.format(name, version)
+            for version in range(since + 1, until + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return [changes[key] for key in keys]
@@ -0,0 +1,81 @@
+import hashlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = 'db:sticky:{}'
+
+# Состояние текущего запроса: можно ли читать с реплики и была ли запись.
+_request_state = ContextVar('request_state', default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES
+            if alias.startswith('replica_')]
+
+
+class PrimaryReplicaRouter:
+    """Чтения безопасных запросов идут на реплики, остальное — на основную.
+
+    Вне запросов, внутри транзакции и после первой записи в запросе
+    чтения остаются на основной базе.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if (state is None or not state['replica']
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replica_aliases())
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['replica'] = False
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def sticky_key(request):
+    """Ключ клиента: заголовок авторизации, сессия или адрес."""
+    client = (request.META.get('HTTP_AUTHORIZATION')
+              or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+              or request.META.get('REMOTE_ADDR', ''))
+    return STICKY_KEY.format(hashlib.sha1(client.encode()).hexdigest())
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает читать с реплик GET-запросам клиента, который недавно
+    ничего не записывал, чтобы он сразу видел свои изменения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DB_REPLICAS:
+            return self.get_response(request)
+        key = sticky_key(request)
+        state = {
+            'replica': (request.method in SAFE_METHODS
+                        and not cache.get(key)),
+            'wrote': False,
+        }
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state['wrote'] or request.method not in SAFE_METHODS:
+            cache.set(key, True, settings.DB_REPLICA_STICKY_SECONDS)
+        return response
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 
 from pathlib import Path
 
@@ -37,6 +38,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'foodgram.routers.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'api.urls'
@@ -60,28 +62,55 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-        'USER': 'postgres',
-        'PASSWORD': 'postgres',
-        'HOST': 'localhost',
-        'PORT': '5432',
-    }
-}
+# По умолчанию SQLite; для PostgreSQL DB_ENGINE=django.db.backends.postgresql.
+DB_ENGINE = os.getenv('DB_ENGINE', default='django.db.backends.sqlite3')
+DB_SQLITE = DB_ENGINE == 'django.db.backends.sqlite3'
 
 
-'''DATABASES = {
-    'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
-        'NAME': os.getenv('DB_NAME', default='postgres'),
-        'USER': os.getenv('POSTGRES_USER', default='postgres'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
-        'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+def database(replica=None):
+    """Настройки подключения; replica — файл SQLite или хост[:порт]."""
+    config = {
+        'ENGINE': DB_ENGINE,
+        # Соединение живет между запросами, а не открывается на каждый.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
     }
-}'''
+    if DB_SQLITE:
+        name = replica or os.getenv('DB_NAME', default='db.sqlite3')
+        return dict(config, NAME=os.path.join(BASE_DIR, name))
+    host, _, port = (replica or '').partition(':')
+    return dict(
+        config,
+        NAME=os.getenv('DB_NAME', default='postgres'),
+        USER=os.getenv('POSTGRES_USER', default='postgres'),
+        PASSWORD=os.getenv('POSTGRES_PASSWORD', default='postgres'),
+        HOST=host or os.getenv('DB_HOST', default='db'),
+        PORT=port or os.getenv('DB_PORT', default='5432'),
+    )
+
+
+DATABASES = {'default': database()}
+
+# Реплики для чтения через запятую: файлы SQLite или хост[:порт].
+DB_REPLICAS = [
+    replica.strip()
+    for replica in os.getenv('DB_REPLICAS', default='').split(',')
+    if replica.strip()
+]
+for number, replica in enumerate(DB_REPLICAS):
+    DATABASES[f'replica_{number}'] = dict(
+        database(replica), TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['foodgram.routers.PrimaryReplicaRouter']
+
+# Проверять постоянное соединение перед запросом и переоткрывать его,
+# если база его закрыла.
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS',
+                                  default='True') == 'True'
+
+# Сколько секунд после записи клиент читает с основной базы, чтобы
+# видеть собственные изменения.
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS',
+                                          default=5))
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -105,12 +134,82 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'assistance.authentication.StatelessJWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
     'PAGE_SIZE': 10,
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
 }
 
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_MINUTES', default=15))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        days=int(os.getenv('JWT_REFRESH_DAYS', default=7))),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
+
+# Как часто процесс перечитывает отозванные токены из базы целиком.
+JWT_REVOCATION_SYNC_INTERVAL = int(os.getenv('JWT_REVOCATION_SYNC_INTERVAL',
+                                             default=60))
+
+# Версии данных для инвалидации хранятся в кэше, поэтому при нескольких
+# процессах нужен общий бэкенд: file или memcached. CACHE_LOCATION задает
+# каталог для file и адрес сервера для memcached.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[os.getenv('CACHE_BACKEND', default='locmem')],
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT',
+                                        default=60 * 60 * 24))
+
+PAGINATION_COUNT_TIMEOUT = int(os.getenv('PAGINATION_COUNT_TIMEOUT',
+                                         default=30))
+
+PAGINATION_ESTIMATE_THRESHOLD = (
+    int(os.getenv('PAGINATION_ESTIMATE_THRESHOLD'))
+    if os.getenv('PAGINATION_ESTIMATE_THRESHOLD') else None
+)
+
+IMAGE_UPLOAD_MAX_BYTES = int(os.getenv('IMAGE_UPLOAD_MAX_BYTES',
+                                       default=5 * 1024 * 1024))
+
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv('IMAGE_UPLOAD_MAX_PIXELS',
+                                        default=25 * 1000 * 1000))
+
+# Ширина уменьшенных копий изображений рецептов в пикселях.
+IMAGE_DERIVATIVES = {'card': 480, 'detail': 1200}
+
+# 0 строит копии прямо в запросе, после коммита.
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv('IMAGE_DERIVATIVE_WORKERS',
+                                         default=2))
+
+# PDF списка покупок собирается целиком до отправки (см.
+# assistance.shopping_list.build_pdf); больше этого размера он уходит
+# из памяти во временный файл.
+SHOPPING_LIST_PDF_SPOOL_SIZE = int(os.getenv('SHOPPING_LIST_PDF_SPOOL_SIZE',
+                                             default=1024 * 1024))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+
+# Рецепты авторов, у которых подписчиков больше порога, не раскладываются
+# по лентам при публикации, а подмешиваются при чтении ленты.
+FEED_CELEBRITY_FOLLOWERS = int(os.getenv('FEED_CELEBRITY_FOLLOWERS',
+                                         default=1000))
+FEED_CELEBRITY_TIMEOUT = int(os.getenv('FEED_CELEBRITY_TIMEOUT',
+                                       default=60 * 10))
+# Сколько последних рецептов автора попадает в ленту при подписке.
+FEED_BACKFILL_RECIPES = int(os.getenv('FEED_BACKFILL_RECIPES', default=100))
+
 LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
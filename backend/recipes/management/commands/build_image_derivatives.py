@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from assistance.images import save_derivatives
+from assistance.thumbnails import render_derivatives
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Строит уменьшенные копии изображений рецептов, у которых их '
+            'нет или они построены для другого изображения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        last_id = 0
+        total = 0
+        while True:
+            batch = list(Recipe.objects.filter(pk__gt=last_id).exclude(
+                image='').exclude(image=None).order_by('pk').values_list(
+                    'pk', 'image', 'image_derivatives')[:batch_size])
+            if not batch:
+                break
+            for pk, source, derivatives in batch:
+                if derivatives.get('source') == source:
+                    continue
+                try:
+                    paths = render_derivatives(default_storage.path(source),
+                                               settings.IMAGE_DERIVATIVES)
+                except OSError as error:
+                    self.stderr.write(f'{source}: {error}')
+                    continue
+                save_derivatives(pk, source, paths)
+                total += 1
+            last_id = batch[-1][0]
+        self.stdout.write(self.style.SUCCESS(
+            f'Построены копии для рецептов: {total} '
+            f'за {time.monotonic() - started:.2f} с.'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assistance.similarity import index_recipes
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает MinHash-сигнатуры и корзины LSH всех рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        last_id = 0
+        total = 0
+        while True:
+            batch = list(Recipe.objects.filter(pk__gt=last_id).order_by(
+                'pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            index_recipes(batch)
+            total += len(batch)
+            last_id = batch[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {total} '
+            f'за {time.monotonic() - started:.2f} с.'))
@@ -0,0 +1,107 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from assistance.shopping_list import shopping_list
+from assistance.utils import filter_by_tags, subscriptions_queryset
+from recipes.models import (AmountOfIngredient, Cart, Favorite, Recipe, Tag,
+                            TimelineEntry)
+from users.models import User
+
+# SQLite: «SCAN t» без «USING ... INDEX» — полный просмотр таблицы.
+SQLITE_FULL_SCAN = re.compile(
+    r'\bSCAN (?!SUBQUERY|CONSTANT)(\S+)(?!.*\bUSING\b.*INDEX)')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|DISTINCT)')
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\S+)')
+POSTGRES_SORT = re.compile(r'(^|->\s+)Sort\s+\(', re.MULTILINE)
+
+
+def main_queries(user):
+    """Основные запросы вьюсетов: (название, queryset, допустима ли
+    сортировка в памяти)."""
+    recipes = Recipe.objects.with_user_flags(user)
+    tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+    recipe_ids = list(Recipe.objects.order_by('-pub_date').values_list(
+        'pk', flat=True)[:10])
+    return [
+        ('recipes: список', recipes.order_by('-pub_date', '-id')[:10],
+         False),
+        ('recipes: автор', recipes.filter(author=user).order_by(
+            '-pub_date', '-id')[:10], False),
+        ('recipes: популярные', recipes.order_by(
+            '-favorites_count', '-pub_date', '-id')[:10], False),
+        ('recipes: тэги', filter_by_tags(recipes, tags).order_by(
+            '-pub_date', '-id')[:10], False),
+        ('recipes: избранное', recipes.filter(is_favorited=True).order_by(
+            '-pub_date', '-id')[:10], False),
+        ('favorite: проверка', Favorite.objects.filter(
+            user=user, recipe_id=recipe_ids[0]).values('pk'), False),
+        ('shopping_cart: проверка', Cart.objects.filter(
+            user=user, recipe_id=recipe_ids[0]).values('pk'), False),
+        ('users: подписки', subscriptions_queryset(user)[:10], False),
+        ('recipes: лента', TimelineEntry.objects.filter(user=user).order_by(
+            '-pub_date', '-recipe_id').values('pub_date', 'recipe_id')[:10],
+         False),
+        # Список покупок одного пользователя невелик, сортировать его
+        # по названию в памяти дешевле, чем держать ради этого индекс.
+        ('download: список покупок', shopping_list(user), True),
+        ('download: состав рецептов', AmountOfIngredient.objects.filter(
+            recipe_id__in=recipe_ids).values('ingredient_id', 'amount'),
+         False),
+    ]
+
+
+def plan_problems(plan, allow_sort):
+    """Полные просмотры таблиц и сортировки во временном B-дереве."""
+    if connection.vendor == 'postgresql':
+        full_scan, sort = POSTGRES_FULL_SCAN, POSTGRES_SORT
+    else:
+        full_scan, sort = SQLITE_FULL_SCAN, SQLITE_SORT
+    problems = [f'полный просмотр {table}'
+                for table in full_scan.findall(plan)]
+    if not allow_sort and sort.search(plan):
+        problems.append('сортировка без индекса')
+    return problems
+
+
+class Command(BaseCommand):
+    help = ('Строит EXPLAIN для основных запросов вьюсетов на заполненной '
+            'базе и завершается с ошибкой, если план читает таблицу '
+            'целиком или сортирует без индекса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int,
+                            help='id пользователя для запросов.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(pk=options['user'])
+        user = users.first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError('В базе нет пользователей или рецептов.')
+        failed = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # На маленькой базе планировщик предпочтет Seq Scan даже
+                # при подходящем индексе; запрещаем его, чтобы видеть,
+                # есть ли индекс вообще.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                    cursor.execute('SET LOCAL enable_sort = off')
+            for name, queryset, allow_sort in main_queries(user):
+                plan = queryset.explain()
+                problems = plan_problems(plan, allow_sort)
+                if problems:
+                    failed.append(name)
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: {", ".join(problems)}'))
+                    self.stdout.write(plan)
+                else:
+                    self.stdout.write(f'{name}: ok')
+                    if options['verbosity'] > 1:
+                        self.stdout.write(plan)
+        if failed:
+            raise CommandError(f'Планы без индекса: {", ".join(failed)}.')
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы.'))
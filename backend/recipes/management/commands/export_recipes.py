@@ -0,0 +1,75 @@
+import json
+import shutil
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+RECIPES_FILE = 'recipes.ndjson'
+IMAGES_DIR = 'images'
+
+
+def recipe_to_dict(recipe, images):
+    """Строка выгрузки; изображение копируется в каталог images."""
+    image = ''
+    if recipe.image:
+        name = f'{recipe.pk}{Path(recipe.image.name).suffix}'
+        with recipe.image.open('rb') as source, \
+                (images / name).open('wb') as target:
+            shutil.copyfileobj(source, target)
+        image = f'{IMAGES_DIR}/{name}'
+    return {
+        'author': recipe.author.username,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': image,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            [amount.ingredient.name, amount.ingredient.measurement_unit,
+             amount.amount]
+            for amount in recipe.amounts_of_ingredients.all()
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты в каталог: recipes.ndjson по строке на рецепт '
+            'и файлы изображений в images/.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        root = Path(options['path'])
+        images = root / IMAGES_DIR
+        images.mkdir(parents=True, exist_ok=True)
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        last_id = 0
+        total = 0
+        with (root / RECIPES_FILE).open('w', encoding='utf-8') as stream:
+            while True:
+                batch = list(Recipe.objects.with_relations().filter(
+                    pk__gt=last_id).order_by('pk')[:batch_size])
+                if not batch:
+                    break
+                for recipe in batch:
+                    try:
+                        line = recipe_to_dict(recipe, images)
+                    except FileNotFoundError:
+                        self.stderr.write(
+                            f'Нет файла изображения рецепта {recipe.pk}, '
+                            f'рецепт пропущен.')
+                        continue
+                    stream.write(json.dumps(line, ensure_ascii=False))
+                    stream.write('\n')
+                    total += 1
+                last_id = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {total} '
+            f'за {time.monotonic() - started:.2f} с.'))
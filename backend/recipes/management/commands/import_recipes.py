@@ -0,0 +1,185 @@
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.files import File
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from assistance.feed import fan_out
+from assistance.images import schedule_derivatives
+from assistance.ingredient_index import INGREDIENTS_VERSION
+from assistance.similarity import index_recipes
+from assistance.utils import bulk_create_with_pks
+from assistance.versioning import bump_table_versions, bump_version
+from recipes.models import AmountOfIngredient, Ingredient, Recipe, Tag
+from users.models import User
+from .export_recipes import RECIPES_FILE
+
+CHECKPOINT_FILE = 'recipes.ndjson.checkpoint'
+
+
+def ingredient_ids(pairs):
+    """id ингредиентов по (название, единица); недостающие создаются."""
+    def lookup():
+        return {
+            (name, unit): pk
+            for pk, name, unit in Ingredient.objects.filter(
+                name__in={name for name, _ in pairs}
+            ).values_list('id', 'name', 'measurement_unit')
+            if (name, unit) in pairs
+        }
+
+    ids = lookup()
+    if len(ids) < len(pairs):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in pairs - set(ids)],
+            ignore_conflicts=True)
+        bump_version(INGREDIENTS_VERSION)
+        bump_table_versions(Ingredient)
+        ids = lookup()
+    return ids
+
+
+def new_items(items, authors):
+    """Строки выгрузки, которых еще нет в базе.
+
+    Рецепт узнается по автору, названию и дате публикации, поэтому
+    повторная загрузка той же выгрузки не создает дубликатов.
+    """
+    existing = set(Recipe.objects.filter(
+        author_id__in={authors[item['author']] for item in items},
+        name__in={item['name'] for item in items}
+    ).values_list('author_id', 'name', 'pub_date'))
+    result = []
+    for item in items:
+        key = (authors[item['author']], item['name'],
+               parse_datetime(item['pub_date']))
+        if key not in existing:
+            existing.add(key)
+            result.append(item)
+    return result
+
+
+def save_image(root, name):
+    """Кладет файл изображения из выгрузки в хранилище рецептов."""
+    if not name:
+        return ''
+    field = Recipe._meta.get_field('image')
+    with (root / name).open('rb') as image:
+        return field.storage.save(
+            field.generate_filename(None, Path(name).name), File(image))
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты, выгруженные export_recipes. После каждой '
+            'пачки позиция в файле сохраняется, и прерванная загрузка '
+            'продолжается с нее при следующем запуске.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать с начала файла, забыв позицию.')
+
+    def handle(self, *args, **options):
+        root = Path(options['path'])
+        source = root / RECIPES_FILE
+        if not source.exists():
+            raise CommandError(f'Файл не найден: {source}')
+        checkpoint = root / CHECKPOINT_FILE
+        position = 0
+        if checkpoint.exists() and not options['restart']:
+            position = int(checkpoint.read_text())
+            self.stdout.write(f'Продолжаю с позиции {position}.')
+
+        tags = dict(Tag.objects.values_list('slug', 'id'))
+        started = time.monotonic()
+        created = skipped = 0
+        with source.open('rb') as stream:
+            stream.seek(position)
+            while True:
+                lines = list(islice(stream, options['batch_size']))
+                if not lines:
+                    break
+                items = [json.loads(line) for line in lines if line.strip()]
+                imported = self.import_batch(root, items, tags)
+                created += imported
+                skipped += len(items) - imported
+                checkpoint.write_text(str(stream.tell()))
+        if checkpoint.exists():
+            checkpoint.unlink()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {created}, пропущено: {skipped} '
+            f'за {time.monotonic() - started:.2f} с.'))
+        # Поиск обновляют триггеры базы: проверяем, что они на месте.
+        call_command('rebuild_search_index', '--check', stdout=self.stdout)
+
+    def import_batch(self, root, items, tags):
+        authors = dict(User.objects.filter(
+            username__in={item['author'] for item in items}
+        ).values_list('username', 'id'))
+        items = new_items(
+            [item for item in items if item['author'] in authors], authors)
+        if not items:
+            return 0
+        ingredients = ingredient_ids({
+            (name, unit)
+            for item in items for name, unit, _ in item['ingredients']
+        })
+        images = []
+        try:
+            with transaction.atomic():
+                recipes = self.create_recipes(
+                    root, items, authors, tags, ingredients, images)
+        except BaseException:
+            # Откат транзакции не удаляет уже записанные файлы.
+            storage = Recipe._meta.get_field('image').storage
+            for name in images:
+                storage.delete(name)
+            raise
+        # bulk_create не отправляет сигналы, версии поднимаем явно.
+        bump_table_versions(Recipe, Recipe.tags.through, AmountOfIngredient)
+        bump_version('pantry')
+        return len(recipes)
+
+    def create_recipes(self, root, items, authors, tags, ingredients,
+                       images):
+        """Создает рецепты пачки; имена сохраненных файлов — в images."""
+        recipes = []
+        for item in items:
+            image = save_image(root, item['image'])
+            if image:
+                images.append(image)
+            recipes.append(Recipe(
+                author_id=authors[item['author']], name=item['name'],
+                text=item['text'], cooking_time=item['cooking_time'],
+                image=image))
+        bulk_create_with_pks(Recipe, recipes)
+        # pub_date с auto_now_add при вставке всегда получает
+        # текущее время, исходную дату возвращаем отдельно.
+        for recipe, item in zip(recipes, items):
+            recipe.pub_date = parse_datetime(item['pub_date'])
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tags[slug])
+            for recipe, item in zip(recipes, items)
+            for slug in set(item['tags']) if slug in tags
+        ])
+        AmountOfIngredient.objects.bulk_create([
+            AmountOfIngredient(
+                recipe_id=recipe.pk,
+                ingredient_id=ingredients[name, unit], amount=amount)
+            for recipe, item in zip(recipes, items)
+            for name, unit, amount in item['ingredients']
+        ])
+        index_recipes([recipe.pk for recipe in recipes])
+        # bulk_create не отправляет post_save, ленты заполняем явно.
+        fan_out(*recipes)
+        for recipe in recipes:
+            schedule_derivatives(recipe)
+        return recipes
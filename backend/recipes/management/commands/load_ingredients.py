@@ -0,0 +1,123 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from assistance.ingredient_index import INGREDIENTS_VERSION
+from assistance.versioning import bump_table_versions, bump_version
+from recipes.models import Ingredient
+
+DEFAULT_PATH = Path(settings.BASE_DIR) / 'data' / 'ingredients.csv'
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(stream):
+    for row in csv.reader(stream):
+        if len(row) != 2:
+            continue
+        yield row[0], row[1]
+
+
+def iter_json(stream):
+    """Потоково разбирает JSON-массив объектов, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив ингредиентов.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+        buffer = buffer[position:]
+    if buffer.strip():
+        raise CommandError('Файл ингредиентов оборван или поврежден.')
+
+
+READERS = {'.csv': iter_csv, '.json': iter_json}
+
+
+def insert_ignoring_conflicts(rows):
+    """Вставляет пачку строк одним executemany, пропуская дубликаты.
+
+    В отличие от bulk_create не создает экземпляры модели и не упирается
+    в лимит параметров SQLite, поэтому пачки могут быть большими.
+    """
+    meta = Ingredient._meta
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(meta.get_field(name).column)
+        for name in ('name', 'measurement_unit')
+    )
+    sql = '{} {} ({}) VALUES (%s, %s){}'.format(
+        connection.ops.insert_statement(ignore_conflicts=True),
+        quote(meta.db_table),
+        columns,
+        connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+class Command(BaseCommand):
+    help = 'Загружает каталог ингредиентов из CSV или JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_PATH))
+        parser.add_argument('--format', choices=('csv', 'json'))
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        suffix = f'.{options["format"]}' if options['format'] else path.suffix
+        reader = READERS.get(suffix.lower())
+        if reader is None:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+
+        batch_size = options['batch_size']
+        before = Ingredient.objects.count()
+        processed = 0
+        started = time.monotonic()
+        with path.open(encoding='utf-8', newline='') as stream:
+            rows = reader(stream)
+            while True:
+                batch = [
+                    (name.strip(), unit.strip())
+                    for name, unit in islice(rows, batch_size)
+                ]
+                if not batch:
+                    break
+                insert_ignoring_conflicts(batch)
+                processed += len(batch)
+        elapsed = time.monotonic() - started
+        bump_version(INGREDIENTS_VERSION)
+        bump_table_versions(Ingredient)
+
+        created = Ingredient.objects.count() - before
+        rate = processed / elapsed if elapsed else processed
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {processed} строк, добавлено {created} '
+            f'за {elapsed:.2f} с ({rate:.0f} строк/с).'
+        ))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from assistance.cart_totals import expected_totals
+from recipes.models import Cart, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Сверяет списки покупок с корзинами и исправляет расхождения. '
+            'С --check только сообщает о них.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(Cart.objects.values_list('user_id', flat=True))
+            | set(ShoppingListItem.objects.values_list('user_id', flat=True))
+        )
+        batch_size = options['batch_size']
+        drifted = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            drifted += self.reconcile(batch, options['check'])
+        if options['check'] and drifted:
+            raise CommandError(f'Расхождений в списках покупок: {drifted}.')
+        action = 'Найдено' if options['check'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} расхождений: {drifted}.'))
+
+    def reconcile(self, user_ids, check):
+        expected = expected_totals(user_ids)
+        stale, changed = [], []
+        with transaction.atomic():
+            items = ShoppingListItem.objects.select_for_update().filter(
+                user_id__in=user_ids)
+            for item in items:
+                amount = expected[item.user_id].pop(item.ingredient_id, 0)
+                if amount <= 0:
+                    stale.append(item.pk)
+                elif amount != item.amount:
+                    item.amount = amount
+                    changed.append(item)
+            missing = [
+                ShoppingListItem(user_id=user_id, ingredient_id=pk,
+                                 amount=amount)
+                for user_id, amounts in expected.items()
+                for pk, amount in amounts.items()
+                if amount > 0
+            ]
+            if not check:
+                ShoppingListItem.objects.filter(pk__in=stale).delete()
+                ShoppingListItem.objects.bulk_update(changed, ['amount'])
+                ShoppingListItem.objects.bulk_create(missing)
+        return len(stale) + len(changed) + len(missing)
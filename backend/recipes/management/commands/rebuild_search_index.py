@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from assistance.search_schema import (restore_search_index,
+                                      search_index_drift)
+from assistance.versioning import bump_table_versions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сверяет полнотекстовый индекс рецептов с recipes_recipe, '
+            'пересоздает недостающие триггеры и заполняет индекс заново. '
+            'С --check только сообщает о расхождениях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true')
+
+    def handle(self, *args, **options):
+        alias = router.db_for_write(Recipe)
+        connection = connections[alias]
+        missing, rows = search_index_drift(connection)
+        if options['check']:
+            if missing or rows:
+                raise CommandError(
+                    f'Нет триггеров: {", ".join(missing) or "-"}; '
+                    f'расходится строк индекса: {rows}.')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        with transaction.atomic(using=alias):
+            restore_search_index(connection)
+            bump_table_versions(Recipe, using=alias)
+        self.stdout.write(self.style.SUCCESS(
+            f'Восстановлено триггеров: {len(missing)}, '
+            f'исправлено строк индекса: {rows}.'))
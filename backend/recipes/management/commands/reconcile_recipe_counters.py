@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+
+from assistance.utils import actual_counters
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сверяет favorites_count и carts_count рецептов с избранным и '
+            'корзинами. С --check только сообщает о расхождениях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true')
+
+    def handle(self, *args, **options):
+        counters = actual_counters()
+        drifted = Recipe.objects.annotate(**{
+            f'actual_{counter}': expression
+            for counter, expression in counters.items()
+        }).filter(
+            Q(*(~Q(**{counter: F(f'actual_{counter}')})
+                for counter in counters), _connector=Q.OR)
+        ).values_list('pk', flat=True)
+        if options['check']:
+            total = drifted.count()
+            if total:
+                raise CommandError(f'Счетчики расходятся у {total} рецептов.')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        total = Recipe.objects.filter(pk__in=list(drifted)).update(
+            **counters)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлены счетчики у {total} рецептов.'))
@@ -0,0 +1,184 @@
+import gc
+import json
+import math
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'data' / 'benchmark_baseline.json'
+# Разница меньше этой считается шумом, даже если в процентах она велика.
+NOISE_MS = 2.0
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+
+def endpoints():
+    """Замеряемые запросы: (название, путь) на данных seed_benchmark."""
+    recipe = Recipe.objects.order_by('-favorites_count', '-pk').first()
+    tags = '&'.join(
+        f'tags={slug}'
+        for slug in Tag.objects.values_list('slug', flat=True)[:2])
+    ingredients = '&'.join(
+        f'ingredients={pk}'
+        for pk in recipe.amounts_of_ingredients.values_list(
+            'ingredient_id', flat=True)[:5])
+    return [
+        ('recipes', '/api/recipes/'),
+        ('recipes_offset', '/api/recipes/?limit=10&offset=500'),
+        ('recipes_cursor', '/api/recipes/?pagination=cursor'),
+        ('recipes_popular', '/api/recipes/?ordering=-favorites_count'),
+        ('recipes_tags', f'/api/recipes/?{tags}'),
+        ('recipes_favorited', '/api/recipes/?is_favorited=1'),
+        ('recipes_author', f'/api/recipes/?author={recipe.author_id}'),
+        ('recipes_search', '/api/recipes/?search=рецепт'),
+        ('recipe_detail', f'/api/recipes/{recipe.pk}/'),
+        ('recipe_similar', f'/api/recipes/{recipe.pk}/similar/'),
+        ('recipes_match', f'/api/recipes/match/?{ingredients}'),
+        ('recipes_feed', '/api/recipes/feed/'),
+        ('subscriptions', '/api/users/subscriptions/'),
+        ('download', '/api/recipes/download_shopping_cart/'),
+        ('ingredients', '/api/ingredients/?name=ма'),
+        ('tags', '/api/tags/'),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку (p50/p95/p99), число запросов к базе и пик '
+            'памяти основных эндпоинтов на данных seed_benchmark и '
+            'сравнивает их с сохраненным базовым замером. Запросы и память '
+            'меряются с пустым кэшем: команда очищает его, запускать ее '
+            'нужно на отдельной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', nargs='*', default=(),
+                            help='Замерить только эти эндпоинты.')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true')
+        parser.add_argument('--tolerance', type=float, default=0.3,
+                            help='Допустимое ухудшение p95 и памяти, доля.')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш и перед замером задержки.')
+
+    def handle(self, *args, **options):
+        user = User.objects.annotate(
+            follows=Count('follower')).order_by('-follows', 'pk').first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError(
+                'База пуста, сначала выполните seed_benchmark.')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer {}'.format(
+            RefreshToken.for_user(user).access_token))
+
+        results = {}
+        for name, path in endpoints():
+            if options['only'] and name not in options['only']:
+                continue
+            results[name] = self.measure(
+                client, path, options['warmup'], options['requests'],
+                options['cold'])
+
+        baseline_path = Path(options['baseline'])
+        baselines = {}
+        if baseline_path.exists():
+            baselines = json.loads(
+                baseline_path.read_text(encoding='utf-8'))
+        # Холодные и теплые замеры несравнимы, у каждого режима своя база.
+        baseline = baselines.setdefault(
+            'cold' if options['cold'] else 'warm', {})
+        regressions = self.report(results, baseline, options['tolerance'])
+        if options['save_baseline']:
+            baseline.update(results)
+            baseline_path.write_text(
+                json.dumps(baselines, indent=2, sort_keys=True),
+                encoding='utf-8')
+            self.stdout.write(f'Базовый замер сохранен в {baseline_path}.')
+        elif regressions:
+            raise CommandError(f'Ухудшения: {", ".join(regressions)}.')
+
+    def measure(self, client, path, warmup, requests, cold):
+        for _ in range(warmup):
+            self.request(client, path)
+        gc.collect()
+        latencies = []
+        for _ in range(requests):
+            if cold:
+                cache.clear()
+            started = time.perf_counter()
+            self.request(client, path)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        # С теплым кэшем ответ не доходит до базы, и лишние запросы
+        # (N+1) были бы не видны.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.request(client, path)
+        # Следующий запрос очистит журнал запросов соединения.
+        query_count = len(queries)
+        cache.clear()
+        tracemalloc.start()
+        try:
+            self.request(client, path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            'p50': round(percentile(latencies, 0.5), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'queries': query_count,
+            'peak_kib': round(peak / 1024),
+        }
+
+    def request(self, client, path):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: ответ {response.status_code}.')
+        # Потоковые ответы (download) нужно дочитать, чтобы замер был
+        # честным.
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+
+    def report(self, results, baseline, tolerance):
+        self.stdout.write(
+            f'{"эндпоинт":<20}{"p50 мс":>9}{"p95 мс":>9}{"p99 мс":>9}'
+            f'{"запросы":>9}{"пик КиБ":>9}  сравнение')
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            problems = []
+            if base:
+                if (result['p95'] > base['p95'] * (1 + tolerance)
+                        and result['p95'] - base['p95'] > NOISE_MS):
+                    problems.append(f'p95 было {base["p95"]}')
+                if result['queries'] > base['queries']:
+                    problems.append(f'запросов было {base["queries"]}')
+                if result['peak_kib'] > base['peak_kib'] * (1 + tolerance):
+                    problems.append(f'памяти было {base["peak_kib"]}')
+            comparison = ('нет базы' if not base
+                          else '; '.join(problems) or 'ok')
+            line = (f'{name:<20}{result["p50"]:>9}{result["p95"]:>9}'
+                    f'{result["p99"]:>9}{result["queries"]:>9}'
+                    f'{result["peak_kib"]:>9}  {comparison}')
+            if problems:
+                regressions.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        return regressions
@@ -0,0 +1,208 @@
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from assistance.feed import backfill, followers
+from assistance.utils import bulk_create_with_pks
+from assistance.versioning import bump_table_versions, bump_version
+from recipes.models import (AmountOfIngredient, Cart, Favorite, Follow,
+                            Ingredient, Recipe, Tag)
+from users.models import User
+
+USERNAME_PREFIX = 'bench_'
+IMAGE_NAME = 'recipes/benchmark.png'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#D4A373', 'baking'),
+    ('Суп', '#2D9CDB', 'soup'),
+    ('Салат', '#6FCF97', 'salad'),
+    ('Постное', '#828282', 'lenten'),
+)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def skewed_sample(rng, population, weights, k):
+    """До k разных элементов; популярные выпадают чаще, как в жизни."""
+    return set(rng.choices(population, weights, k=k))
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными для run_benchmarks: '
+            'пользователи, рецепты с ингредиентами из каталога, тэги, '
+            'подписки, избранное и корзины. Популярность авторов и '
+            'рецептов распределена по закону Ципфа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Рецептов в избранном у пользователя.')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Рецептов в корзине у пользователя.')
+        parser.add_argument('--min-ingredients', type=int, default=3)
+        parser.add_argument('--max-ingredients', type=int, default=12)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', stdout=self.stdout)
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        if not ingredient_ids:
+            raise CommandError('Каталог ингредиентов пуст.')
+
+        user_ids = self.create_users(options['users'])
+        tag_ids = self.create_tags()
+        recipe_ids, authors = self.create_recipes(
+            options['recipes'], user_ids, tag_ids, ingredient_ids,
+            options['min_ingredients'], options['max_ingredients'])
+        self.step('Подписки', self.create_follows(
+            user_ids, options['follows']))
+        self.step('Избранное', self.create_links(
+            Favorite, user_ids, recipe_ids, options['favorites']))
+        self.step('Корзины', self.create_links(
+            Cart, user_ids, recipe_ids, options['carts']))
+
+        # bulk_create обходит сигналы: производные данные строим явно.
+        bump_table_versions(User, Tag, Recipe, Recipe.tags.through,
+                            AmountOfIngredient, Follow, Favorite, Cart)
+        bump_version('pantry')
+        call_command('reconcile_recipe_counters', stdout=self.stdout)
+        call_command('rebuild_cart_totals', stdout=self.stdout)
+        for author_id in set(authors):
+            backfill(followers(author_id), author_id)
+        call_command('build_similarity_index', stdout=self.stdout)
+        call_command('rebuild_search_index', '--check', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'База заполнена за {time.monotonic() - started:.1f} с.'))
+
+    def step(self, name, total):
+        self.stdout.write(f'{name}: {total}')
+
+    def create_users(self, count):
+        first = User.objects.filter(
+            username__startswith=USERNAME_PREFIX).count()
+        password = make_password('benchmark')
+        users = [
+            User(username=f'{USERNAME_PREFIX}{number}',
+                 email=f'{USERNAME_PREFIX}{number}@example.com',
+                 first_name='Тест', last_name=f'Пользователь {number}',
+                 password=password)
+            for number in range(first, first + count)
+        ]
+        with transaction.atomic():
+            for batch in batches(users, self.batch_size):
+                bulk_create_with_pks(User, batch)
+        self.step('Пользователи', len(users))
+        return [user.pk for user in users]
+
+    def create_tags(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color})
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def placeholder_image(self):
+        field = Recipe._meta.get_field('image')
+        if not field.storage.exists(IMAGE_NAME):
+            content = io.BytesIO()
+            Image.new('RGB', (600, 400), '#E26C2D').save(content, 'PNG')
+            field.storage.save(IMAGE_NAME, ContentFile(content.getvalue()))
+        return IMAGE_NAME
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids,
+                       min_ingredients, max_ingredients):
+        rng = self.rng
+        image = self.placeholder_image()
+        now = timezone.now()
+        author_weights = [1 / (rank + 1) for rank in range(len(user_ids))]
+        authors = rng.choices(user_ids, author_weights, k=count)
+        recipe_ids = []
+        for batch in batches(enumerate(authors), self.batch_size):
+            recipes = [
+                Recipe(author_id=author_id, name=f'Рецепт {number}',
+                       text='Смешать, довести до готовности и подать.',
+                       cooking_time=rng.randint(5, 180), image=image)
+                for number, author_id in batch
+            ]
+            with transaction.atomic():
+                bulk_create_with_pks(Recipe, recipes)
+                # auto_now_add перезаписывает pub_date при вставке.
+                for recipe in recipes:
+                    recipe.pub_date = now - timedelta(
+                        seconds=rng.randint(0, 365 * 24 * 60 * 60))
+                Recipe.objects.bulk_update(recipes, ['pub_date'])
+                Recipe.tags.through.objects.bulk_create([
+                    Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in rng.sample(
+                        tag_ids, rng.randint(1, min(3, len(tag_ids))))
+                ])
+                AmountOfIngredient.objects.bulk_create([
+                    AmountOfIngredient(recipe_id=recipe.pk,
+                                       ingredient_id=ingredient_id,
+                                       amount=rng.randint(1, 500))
+                    for recipe in recipes
+                    for ingredient_id in rng.sample(
+                        ingredient_ids,
+                        rng.randint(min_ingredients, max_ingredients))
+                ])
+            recipe_ids.extend(recipe.pk for recipe in recipes)
+        self.step('Рецепты', len(recipe_ids))
+        return recipe_ids, authors
+
+    def create_follows(self, user_ids, per_user):
+        weights = [1 / (rank + 1) for rank in range(len(user_ids))]
+        follows = (
+            Follow(user_id=user_id, following_id=following_id)
+            for user_id in user_ids
+            for following_id in skewed_sample(
+                self.rng, user_ids, weights, per_user)
+            if following_id != user_id
+        )
+        return self.insert(Follow, follows)
+
+    def create_links(self, model, user_ids, recipe_ids, per_user):
+        weights = [1 / (rank + 1) for rank in range(len(recipe_ids))]
+        shuffled = self.rng.sample(recipe_ids, len(recipe_ids))
+        links = (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in skewed_sample(
+                self.rng, shuffled, weights, per_user)
+        )
+        return self.insert(model, links)
+
+    def insert(self, model, objects):
+        total = 0
+        with transaction.atomic():
+            for batch in batches(objects, self.batch_size):
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+        return total
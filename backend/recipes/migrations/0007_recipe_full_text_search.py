@@ -0,0 +1,155 @@
+# Generated by Django 3.2 on 2026-10-18 19:40
+
+from django.db import migrations
+
+def fold_yo(column):
+    """Поиск не различает е и ё, как и индекс ингредиентов."""
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+INGREDIENT_NAMES = '''
+    SELECT {aggregate}
+    FROM recipes_amountofingredient AS a
+    JOIN recipes_ingredient AS i ON i.id = a.ingredient_id
+    WHERE a.recipe_id = {recipe}
+'''
+
+SQLITE_NAMES = INGREDIENT_NAMES.format(
+    aggregate=f"group_concat({fold_yo('i.name')}, ' ')", recipe='{}')
+
+SQLITE_FORWARD = [
+    '''CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5(
+        name, text, ingredients, tokenize = 'unicode61 remove_diacritics 2'
+    )''',
+    '''INSERT INTO recipes_recipe_fts(rowid, name, text, ingredients)
+       SELECT r.id, {}, {}, COALESCE(({}), '')
+       FROM recipes_recipe AS r'''.format(
+        fold_yo('r.name'), fold_yo('r.text'), SQLITE_NAMES.format('r.id')),
+    '''CREATE TRIGGER recipes_recipe_fts_insert
+       AFTER INSERT ON recipes_recipe BEGIN
+           INSERT INTO recipes_recipe_fts(rowid, name, text, ingredients)
+           VALUES (new.id, {}, {}, '');
+       END'''.format(fold_yo('new.name'), fold_yo('new.text')),
+    '''CREATE TRIGGER recipes_recipe_fts_update
+       AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+           UPDATE recipes_recipe_fts SET name = {}, text = {}
+           WHERE rowid = new.id;
+       END'''.format(fold_yo('new.name'), fold_yo('new.text')),
+    '''CREATE TRIGGER recipes_recipe_fts_delete
+       AFTER DELETE ON recipes_recipe BEGIN
+           DELETE FROM recipes_recipe_fts WHERE rowid = old.id;
+       END''',
+    '''CREATE TRIGGER recipes_amount_fts_insert
+       AFTER INSERT ON recipes_amountofingredient BEGIN
+           UPDATE recipes_recipe_fts
+           SET ingredients = COALESCE(({}), '')
+           WHERE rowid = new.recipe_id;
+       END'''.format(SQLITE_NAMES.format('new.recipe_id')),
+    '''CREATE TRIGGER recipes_amount_fts_delete
+       AFTER DELETE ON recipes_amountofingredient BEGIN
+           UPDATE recipes_recipe_fts
+           SET ingredients = COALESCE(({}), '')
+           WHERE rowid = old.recipe_id;
+       END'''.format(SQLITE_NAMES.format('old.recipe_id')),
+    '''CREATE TRIGGER recipes_ingredient_fts_update
+       AFTER UPDATE OF name ON recipes_ingredient BEGIN
+           UPDATE recipes_recipe_fts
+           SET ingredients = COALESCE(({}), '')
+           WHERE rowid IN (
+               SELECT recipe_id FROM recipes_amountofingredient
+               WHERE ingredient_id = new.id
+           );
+       END'''.format(SQLITE_NAMES.format('recipes_recipe_fts.rowid')),
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS recipes_ingredient_fts_update',
+    'DROP TRIGGER IF EXISTS recipes_amount_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_amount_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+]
+
+POSTGRESQL_FORWARD = [
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    '''CREATE INDEX recipes_recipe_search_idx
+       ON recipes_recipe USING GIN (search_vector)''',
+    '''CREATE FUNCTION recipes_recipe_search_refresh(recipe bigint)
+       RETURNS void AS $$
+           UPDATE recipes_recipe AS r SET search_vector =
+               setweight(to_tsvector('russian', {}), 'A')
+               || setweight(to_tsvector('russian', COALESCE(({}), '')), 'B')
+               || setweight(to_tsvector('russian', {}), 'C')
+           WHERE r.id = recipe;
+       $$ LANGUAGE sql'''.format(
+        fold_yo('r.name'),
+        INGREDIENT_NAMES.format(
+            aggregate=f"string_agg({fold_yo('i.name')}, ' ')",
+            recipe='r.id'),
+        fold_yo('r.text')),
+    '''CREATE FUNCTION recipes_recipe_search_trigger()
+       RETURNS trigger AS $$
+       BEGIN
+           IF TG_TABLE_NAME = 'recipes_recipe' THEN
+               PERFORM recipes_recipe_search_refresh(NEW.id);
+           ELSIF TG_TABLE_NAME = 'recipes_ingredient' THEN
+               PERFORM recipes_recipe_search_refresh(a.recipe_id)
+               FROM recipes_amountofingredient AS a
+               WHERE a.ingredient_id = NEW.id;
+           ELSIF TG_OP = 'DELETE' THEN
+               PERFORM recipes_recipe_search_refresh(OLD.recipe_id);
+           ELSE
+               PERFORM recipes_recipe_search_refresh(NEW.recipe_id);
+           END IF;
+           RETURN NULL;
+       END;
+       $$ LANGUAGE plpgsql''',
+    '''CREATE TRIGGER recipes_recipe_search
+       AFTER INSERT OR UPDATE OF name, text ON recipes_recipe
+       FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_trigger()''',
+    '''CREATE TRIGGER recipes_amount_search
+       AFTER INSERT OR DELETE ON recipes_amountofingredient
+       FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_trigger()''',
+    '''CREATE TRIGGER recipes_ingredient_search
+       AFTER UPDATE OF name ON recipes_ingredient
+       FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_trigger()''',
+    'SELECT recipes_recipe_search_refresh(id) FROM recipes_recipe',
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP TRIGGER IF EXISTS recipes_ingredient_search ON recipes_ingredient',
+    ('DROP TRIGGER IF EXISTS recipes_amount_search '
+     'ON recipes_amountofingredient'),
+    'DROP TRIGGER IF EXISTS recipes_recipe_search ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_trigger()',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_refresh(bigint)',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+    'postgresql': (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+}
+
+
+def run(direction):
+    def operation(apps, schema_editor):
+        statements = STATEMENTS.get(schema_editor.connection.vendor)
+        if statements is None:
+            return
+        for statement in statements[direction]:
+            schema_editor.execute(statement, params=None)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(0), run(1)),
+    ]
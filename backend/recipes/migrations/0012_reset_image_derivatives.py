@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def reset_derivatives(apps, schema_editor):
+    """Копии строились по имени без расширения, и у temp.gif и temp.webp
+    она была общей. Старым ссылкам верить нельзя: до перестроения
+    командой build_image_derivatives отдаются оригиналы."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(image_derivatives={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_derivatives, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# SQL зафиксирован здесь, а не импортируется из приложения: иначе правка
+# модуля приложения незаметно меняла бы уже примененную миграцию.
+
+
+def fold_yo(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+SQLITE_NAMES = '''
+    SELECT group_concat({}, ' ')
+    FROM recipes_amountofingredient AS a
+    JOIN recipes_ingredient AS i ON i.id = a.ingredient_id
+    WHERE a.recipe_id = {{}}
+'''.format(fold_yo('i.name'))
+
+SQLITE_FORWARD = [
+    '''CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert
+       AFTER INSERT ON recipes_recipe BEGIN
+           INSERT INTO recipes_recipe_fts(rowid, name, text, ingredients)
+           VALUES (new.id, {}, {}, '');
+       END'''.format(fold_yo('new.name'), fold_yo('new.text')),
+    '''CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update
+       AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+           UPDATE recipes_recipe_fts SET name = {}, text = {}
+           WHERE rowid = new.id;
+       END'''.format(fold_yo('new.name'), fold_yo('new.text')),
+    '''CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete
+       AFTER DELETE ON recipes_recipe BEGIN
+           DELETE FROM recipes_recipe_fts WHERE rowid = old.id;
+       END''',
+    'DELETE FROM recipes_recipe_fts',
+    '''INSERT INTO recipes_recipe_fts(rowid, name, text, ingredients)
+       SELECT r.id, {}, {}, COALESCE(({}), '')
+       FROM recipes_recipe AS r'''.format(
+        fold_yo('r.name'), fold_yo('r.text'), SQLITE_NAMES.format('r.id')),
+]
+
+POSTGRESQL_FORWARD = [
+    'DROP TRIGGER IF EXISTS recipes_recipe_search ON recipes_recipe',
+    '''CREATE TRIGGER recipes_recipe_search
+       AFTER INSERT OR UPDATE OF name, text ON recipes_recipe
+       FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_trigger()''',
+    'SELECT recipes_recipe_search_refresh(id) FROM recipes_recipe',
+]
+
+STATEMENTS = {
+    'sqlite': SQLITE_FORWARD,
+    'postgresql': POSTGRESQL_FORWARD,
+}
+
+
+def restore(apps, schema_editor):
+    for statement in STATEMENTS.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement, params=None)
+
+
+class Migration(migrations.Migration):
+    """0009 пересоздала recipes_recipe в SQLite и удалила ее триггеры
+    полнотекстового индекса: новые рецепты не находились поиском."""
+
+    dependencies = [
+        ('recipes', '0012_reset_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore, migrations.RunPython.noop),
+    ]
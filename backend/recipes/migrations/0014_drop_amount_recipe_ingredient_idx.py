@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 19:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_restore_recipe_search_triggers'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='amountofingredient',
+            name='amount_recipe_ingredient_idx',
+        ),
+    ]
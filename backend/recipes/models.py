@@ -1,20 +1,26 @@
-import base64
-
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
-from django.core.files.base import ContentFile
-from rest_framework.fields import ImageField
+from rest_framework.fields import FileField, ImageField
+from rest_framework.exceptions import ValidationError
 
+from assistance.images import decode_base64_image
 from users.models import User
 
 
 class Base64ImageField(ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')  # format ~= data:image/X,
-            ext = format.split('/')[-1]  # guess file extension
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            header, _, imgstr = data.partition(';base64,')
+            if not imgstr:
+                raise ValidationError('Ожидалось изображение в base64.')
+            # Файл уже проверен Pillow при декодировании, поэтому повторная
+            # проверка ImageField, читающая его в память, не нужна.
+            return FileField.to_internal_value(self, decode_base64_image(
+                imgstr,
+                settings.IMAGE_UPLOAD_MAX_BYTES,
+                settings.IMAGE_UPLOAD_MAX_PIXELS
+            ))
 
         return super().to_internal_value(data)
 
@@ -71,6 +77,35 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_relations(self):
+        """Подгружает автора, тэги и ингредиенты постоянным числом запросов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'amounts_of_ingredients',
+                queryset=AmountOfIngredient.objects.select_related(
+                    'ingredient')
+            )
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует is_favorited и is_in_shopping_cart для пользователя."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField())
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(Cart.objects.filter(
+                user=user, recipe=models.OuterRef('pk')))
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User, verbose_name='Автор рецепта',
@@ -87,6 +122,11 @@ class Recipe(models.Model):
         null=True,
         default=None
     )
+    image_derivatives = models.JSONField(
+        verbose_name='Уменьшенные копии изображения',
+        default=dict,
+        blank=True
+    )
     text = models.TextField(
         verbose_name='Описание рецепта'
     )
@@ -111,11 +151,35 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0
+    )
+    carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['-favorites_count', '-pub_date', '-id'],
+                         name='recipe_favorites_count_idx'),
+            models.Index(fields=['-carts_count', '-pub_date', '-id'],
+                         name='recipe_carts_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -195,3 +259,108 @@ class AmountOfIngredient(models.Model):
 
     def __str__(self):
         return f'{self.ingredient}, {self.amount}'
+
+
+class ShoppingListItem(models.Model):
+    '''Суммарное количество ингредиента в корзине пользователя'''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Покупатель',
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='+'
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient}, {self.amount}'
+
+
+class RecipeSignature(models.Model):
+    '''MinHash-сигнатура набора ингредиентов и тэгов рецепта'''
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='signature'
+    )
+    minhash = models.BinaryField(verbose_name='Сигнатура')
+
+    class Meta:
+        verbose_name = 'Сигнатура рецепта'
+        verbose_name_plural = 'Сигнатуры рецептов'
+
+
+class RecipeBucket(models.Model):
+    '''Корзина LSH, в которую попала полоса сигнатуры рецепта'''
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='buckets'
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    bucket = models.BigIntegerField(verbose_name='Хэш полосы')
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        indexes = [
+            models.Index(fields=['band', 'bucket'],
+                         name='recipe_bucket_band_idx')
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'band'],
+                name='unique_recipe_band'
+            )
+        ]
+
+
+class TimelineEntry(models.Model):
+    '''Рецепт в ленте подписчика; pub_date скопирована для сортировки'''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+        related_name='timeline'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='timeline_user_pub_date_idx')
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry')
+        ]
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import Signal, receiver
+
+from assistance import cart_totals
+from assistance.feed import fan_out
+from assistance.images import schedule_derivatives
+from assistance.ingredient_index import INGREDIENTS_VERSION
+from assistance.pantry import PANTRY_VERSION
+from assistance.similarity import index_recipes
+from assistance.versioning import bump_versions_on_commit, record_change
+from .models import Cart, Ingredient, Recipe
+
+# Отправляется после записи ингредиентов рецепта с аргументами recipe,
+# previous и current: словари {ingredient_id: amount} до и после изменения.
+recipe_ingredients_changed = Signal()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(using, **kwargs):
+    bump_versions_on_commit(INGREDIENTS_VERSION, using=using)
+
+
+@receiver(recipe_ingredients_changed)
+def update_cart_totals(recipe, previous, current, **kwargs):
+    cart_totals.recipe_ingredients_changed(recipe, previous, current)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_cart_totals(instance, **kwargs):
+    for user_id in Cart.objects.filter(recipe=instance).values_list(
+            'user_id', flat=True):
+        cart_totals.cart_changed(user_id, (instance.pk,), -1)
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_derivatives(instance, **kwargs):
+    schedule_derivatives(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def add_to_timelines(instance, created, **kwargs):
+    if created:
+        fan_out(instance)
+
+
+def record_pantry_change(recipe_id):
+    """Записывает изменение рецепта в журнал pantry после коммита.
+
+    Иначе другой процесс успеет перечитать рецепт по старым строкам
+    и сохранить результат уже под новой версией.
+    """
+    transaction.on_commit(
+        lambda: record_change(PANTRY_VERSION, recipe_id))
+
+
+@receiver(recipe_ingredients_changed)
+def update_pantry_index(recipe, **kwargs):
+    record_pantry_change(recipe.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_pantry_index(instance, **kwargs):
+    record_pantry_change(instance.pk)
+
+
+@receiver(recipe_ingredients_changed)
+def update_similarity_index(recipe, **kwargs):
+    index_recipes((recipe.pk,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def reindex_similarity_on_tags(instance, action, reverse, pk_set, **kwargs):
+    """Тэги входят в сигнатуру рецепта, поэтому ее нужно пересчитать."""
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            instance.recipes.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            recipe_ids = (instance.pk,)
+        elif action == 'post_clear':
+            recipe_ids = instance.__dict__.pop('_cleared_recipe_ids', ())
+        else:
+            recipe_ids = pk_set
+        index_recipes(recipe_ids)
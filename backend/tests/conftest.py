@@ -0,0 +1,113 @@
+import base64
+import io
+
+import pytest
+from django.core.cache import cache
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from recipes.models import AmountOfIngredient, Ingredient, Recipe, Tag
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def isolated(settings, tmp_path):
+    """Свой MEDIA_ROOT и пустой кэш: версии таблиц живут в кэше."""
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.IMAGE_DERIVATIVE_WORKERS = 0
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username='reader', email='reader@example.com', password='password',
+        first_name='Читатель', last_name='Тестовый')
+
+
+@pytest.fixture
+def author(db):
+    return User.objects.create_user(
+        username='author', email='author@example.com', password='password',
+        first_name='Автор', last_name='Тестовый')
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Bearer {}'.format(
+        RefreshToken.for_user(user).access_token))
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=name, slug=slug, color=color)
+        for name, slug, color in (('Завтрак', 'breakfast', '#E26C2D'),
+                                  ('Обед', 'lunch', '#49B64E'),
+                                  ('Ужин', 'dinner', '#8775D2'))
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(name=name, measurement_unit='г')
+        for name in ('мука', 'сахар', 'соль', 'свекла', 'капуста')
+    ]
+
+
+@pytest.fixture
+def make_recipes(author, tags, ingredients):
+    """Создает count рецептов с тэгами и ингредиентами."""
+    def make(count, **fields):
+        recipes = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=fields.get('author', author),
+                name=fields.get('name', f'Рецепт {number}'),
+                text='Смешать и запечь.', cooking_time=10)
+            recipe.tags.set(tags[:number % len(tags) + 1])
+            AmountOfIngredient.objects.bulk_create([
+                AmountOfIngredient(recipe=recipe, ingredient=ingredient,
+                                   amount=number + 1)
+                for ingredient in ingredients[:3]
+            ])
+            recipes.append(recipe)
+        return recipes
+    return make
+
+
+def encode_image(color, format):
+    content = io.BytesIO()
+    Image.new('RGB', (20, 20), color).save(content, format)
+    encoded = base64.b64encode(content.getvalue()).decode()
+    return f'data:image/{format.lower()};base64,{encoded}'
+
+
+@pytest.fixture
+def image_data():
+    """Картинка 20x20 в виде data:image/...;base64 для API."""
+    return encode_image
+
+
+@pytest.fixture
+def recipe_payload(tags, ingredients, image_data):
+    """Тело запроса на создание рецепта."""
+    def payload(**fields):
+        data = {
+            'name': 'Борщ',
+            'text': 'Сварить свеклу и капусту.',
+            'cooking_time': 60,
+            'image': image_data('red', 'PNG'),
+            'tags': [tags[0].pk],
+            'ingredients': [{'id': ingredients[3].pk, 'amount': 300},
+                            {'id': ingredients[4].pk, 'amount': 200}],
+        }
+        data.update(fields)
+        return data
+    return payload
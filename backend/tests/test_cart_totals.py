@@ -0,0 +1,32 @@
+from assistance.cart_totals import apply_deltas, expected_totals
+from recipes.models import ShoppingListItem
+
+
+def shopping_list(user):
+    return dict(ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient_id', 'amount'))
+
+
+def test_cart_totals_follow_cart(user, user_client, make_recipes):
+    first, second = make_recipes(2)
+
+    for recipe in (first, second):
+        response = user_client.post(
+            f'/api/recipes/{recipe.pk}/shopping_cart/')
+        assert response.status_code == 201
+    assert shopping_list(user) == expected_totals([user.pk])[user.pk]
+
+    user_client.delete(f'/api/recipes/{first.pk}/shopping_cart/')
+    user_client.delete(f'/api/recipes/{second.pk}/shopping_cart/')
+    assert shopping_list(user) == {}
+
+
+def test_apply_deltas_upserts(user, ingredients):
+    flour, sugar = ingredients[:2]
+    ShoppingListItem.objects.create(user=user, ingredient=flour, amount=5)
+
+    apply_deltas((user.pk,), {flour.pk: 3, sugar.pk: 2})
+    assert shopping_list(user) == {flour.pk: 8, sugar.pk: 2}
+
+    apply_deltas((user.pk,), {flour.pk: -8, sugar.pk: -1})
+    assert shopping_list(user) == {sugar.pk: 1}
@@ -0,0 +1,33 @@
+from django.utils.http import http_date
+
+
+def test_recipe_detail_with_invalid_id_is_404(user_client):
+    assert user_client.get('/api/recipes/abc/').status_code == 404
+
+
+def test_recipe_detail_not_modified_by_etag(user_client, make_recipes):
+    recipe, = make_recipes(1)
+    url = f'/api/recipes/{recipe.pk}/'
+    etag = user_client.get(url)['ETag']
+
+    assert user_client.get(
+        url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+
+def test_recipe_detail_reflects_favorite_changes(
+        user_client, make_recipes, django_capture_on_commit_callbacks):
+    recipe, = make_recipes(1)
+    url = f'/api/recipes/{recipe.pk}/'
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.post(f'{url}favorite/')
+    response = user_client.get(url)
+    assert response.data['is_favorited'] is True
+    etag = response['ETag']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.delete(f'{url}favorite/')
+    for headers in ({'HTTP_IF_NONE_MATCH': etag},
+                    {'HTTP_IF_MODIFIED_SINCE': http_date()}):
+        response = user_client.get(url, **headers)
+        assert response.status_code == 200
+        assert response.data['is_favorited'] is False
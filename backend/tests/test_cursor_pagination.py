@@ -0,0 +1,63 @@
+import base64
+from urllib import parse
+
+import pytest
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+def cursor_offset(link):
+    cursor = parse.parse_qs(parse.urlsplit(link).query)['cursor'][0]
+    tokens = parse.parse_qs(base64.b64decode(cursor).decode())
+    return int(tokens.get('o', ['0'])[0])
+
+
+def walk(client, url, direction):
+    pages, offsets = [], []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append([recipe['id'] for recipe in response.data['results']])
+        url = response.data[direction]
+        if url:
+            offsets.append(cursor_offset(url))
+    return pages, offsets
+
+
+@pytest.mark.parametrize('ordering', (
+    '-favorites_count', 'favorites_count', '-pub_date', 'pub_date'))
+def test_cursor_pages_ties_by_key_without_offset(
+        user_client, make_recipes, ordering):
+    recipes = make_recipes(7)
+    # Одинаковые счетчики и даты: различает рецепты только id.
+    Recipe.objects.update(pub_date=timezone.now(), favorites_count=0)
+    Recipe.objects.filter(pk=recipes[3].pk).update(favorites_count=2)
+    sign = '-' if ordering.startswith('-') else ''
+    expected = list(Recipe.objects.order_by(
+        ordering, sign + 'id').values_list('pk', flat=True))
+
+    pages, offsets = walk(
+        user_client,
+        f'/api/recipes/?pagination=cursor&limit=2&ordering={ordering}',
+        'next')
+    assert [pk for page in pages for pk in page] == expected
+    assert offsets == [0] * len(offsets)
+
+    response = user_client.get(
+        f'/api/recipes/?pagination=cursor&limit=2&ordering={ordering}')
+    last_page = None
+    url = response.data['next']
+    while url:
+        last_page = url
+        url = user_client.get(url).data['next']
+    backward, offsets = walk(user_client, last_page, 'previous')
+    assert [pk for page in reversed(backward) for pk in page] == expected
+    assert offsets == [0] * len(offsets)
+
+
+def test_cursor_with_invalid_position_is_404(user_client, make_recipes):
+    make_recipes(1)
+    cursor = base64.b64encode(b'p=not-json').decode()
+    response = user_client.get(f'/api/recipes/?cursor={cursor}')
+    assert response.status_code == 404
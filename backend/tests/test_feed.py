@@ -0,0 +1,33 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Follow, Recipe, TimelineEntry
+
+
+@pytest.fixture
+def followed_recipes(user, author, make_recipes):
+    Follow.objects.create(user=user, following=author)
+    return make_recipes(3)
+
+
+@pytest.mark.parametrize('limit', ('0', '-5', '1'))
+def test_feed_limit_is_clamped(user_client, followed_recipes, limit):
+    response = user_client.get(f'/api/recipes/feed/?limit={limit}')
+    assert response.status_code == 200
+    assert [recipe['id'] for recipe in response.data['results']] == [
+        followed_recipes[-1].pk]
+    assert response.data['next'] is not None
+
+
+def test_imported_recipes_reach_followers_feeds(
+        user, author, make_recipes, tmp_path):
+    dates = {recipe.name: recipe.pub_date for recipe in make_recipes(3)}
+    call_command('export_recipes', str(tmp_path), stdout=StringIO())
+    Recipe.objects.all().delete()
+    Follow.objects.create(user=user, following=author)
+
+    call_command('import_recipes', str(tmp_path), stdout=StringIO())
+    assert sorted(TimelineEntry.objects.filter(user=user).values_list(
+        'recipe__name', 'pub_date')) == sorted(dates.items())
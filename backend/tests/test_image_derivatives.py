@@ -0,0 +1,47 @@
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from recipes.models import Recipe
+
+
+def card_color(recipe):
+    recipe.refresh_from_db()
+    with default_storage.open(recipe.image_derivatives['card']) as card:
+        return Image.open(card).convert('RGB').getpixel((0, 0))
+
+
+def test_derivatives_of_same_stem_do_not_collide(
+        user_client, recipe_payload, image_data,
+        django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        blue = user_client.post('/api/recipes/', recipe_payload(
+            image=image_data('blue', 'GIF')), format='json').data['id']
+        green = user_client.post('/api/recipes/', recipe_payload(
+            image=image_data('green', 'WEBP')), format='json').data['id']
+
+    blue, green = Recipe.objects.get(pk=blue), Recipe.objects.get(pk=green)
+    assert blue.image.name.rsplit('.', 1)[0] == green.image.name.rsplit(
+        '.', 1)[0]
+    red, _, blue_channel = card_color(blue)
+    assert blue_channel > 200 and red < 50
+    assert card_color(green)[1] > 100
+
+
+def test_replaced_image_derivatives_are_deleted(
+        user_client, recipe_payload, image_data,
+        django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        pk = user_client.post(
+            '/api/recipes/', recipe_payload(), format='json').data['id']
+    old = Recipe.objects.get(pk=pk).image_derivatives
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = user_client.patch(f'/api/recipes/{pk}/', {
+            'image': image_data('blue', 'PNG')}, format='json')
+    assert response.status_code == 200
+
+    new = Recipe.objects.get(pk=pk).image_derivatives
+    assert new['source'] != old['source']
+    for name in ('card', 'card_webp', 'detail', 'detail_webp'):
+        assert default_storage.exists(new[name])
+        assert not default_storage.exists(old[name])
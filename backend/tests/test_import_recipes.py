@@ -0,0 +1,48 @@
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+
+from recipes.management.commands import import_recipes
+from recipes.models import Recipe
+
+
+@pytest.fixture
+def export(user_client, recipe_payload, make_recipes, tmp_path,
+           django_capture_on_commit_callbacks):
+    """Выгрузка трех рецептов, один из них с изображением."""
+    make_recipes(2)
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.post('/api/recipes/', recipe_payload(), format='json')
+    path = tmp_path / 'export'
+    path.mkdir()
+    call_command('export_recipes', str(path), stdout=StringIO())
+    return path
+
+
+def media_files(settings):
+    return {path for path in Path(settings.MEDIA_ROOT).rglob('*')
+            if path.is_file()}
+
+
+def test_reimport_skips_existing_recipes(export):
+    before = sorted(Recipe.objects.values_list('author', 'name', 'pub_date'))
+
+    call_command('import_recipes', str(export), stdout=StringIO())
+    assert sorted(Recipe.objects.values_list(
+        'author', 'name', 'pub_date')) == before
+
+
+def test_failed_batch_removes_saved_images(export, settings, monkeypatch):
+    Recipe.objects.all().delete()
+    files = media_files(settings)
+
+    def fail(recipe_ids):
+        raise RuntimeError('сбой')
+
+    monkeypatch.setattr(import_recipes, 'index_recipes', fail)
+    with pytest.raises(RuntimeError):
+        call_command('import_recipes', str(export), stdout=StringIO())
+    assert not Recipe.objects.exists()
+    assert media_files(settings) == files
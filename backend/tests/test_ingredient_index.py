@@ -0,0 +1,21 @@
+from assistance.ingredient_index import INGREDIENTS_VERSION, IngredientIndex
+from assistance.versioning import get_version
+from recipes.models import Ingredient
+
+
+def test_ingredients_version_bumped_after_commit(
+        ingredients, django_capture_on_commit_callbacks):
+    index = IngredientIndex()
+    assert [row['name'] for row in index.search('св')] == ['свекла']
+    before = get_version(INGREDIENTS_VERSION)
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        Ingredient.objects.create(name='Свёкла сахарная',
+                                  measurement_unit='г')
+    assert get_version(INGREDIENTS_VERSION) == before
+    assert len(index.search('св')) == 1
+
+    for callback in callbacks:
+        callback()
+    assert [row['name'] for row in index.search('св')] == [
+        'свекла', 'Свёкла сахарная']
@@ -0,0 +1,25 @@
+from django.db import connection
+
+from assistance.pagination import cached_count, estimated_count
+from recipes.models import Recipe
+
+
+def test_count_is_exact_without_statistics(make_recipes, settings):
+    settings.PAGINATION_ESTIMATE_THRESHOLD = 1
+    make_recipes(3)
+    Recipe.objects.filter(pk=Recipe.objects.earliest('pk').pk).delete()
+
+    assert estimated_count(Recipe.objects.all()) is None
+    assert cached_count(Recipe.objects.all()) == 2
+
+
+def test_count_estimated_from_statistics(make_recipes, settings):
+    settings.PAGINATION_ESTIMATE_THRESHOLD = 1
+    make_recipes(3)
+    # После удаления MAX(rowid) остался бы 3, статистика — нет.
+    Recipe.objects.filter(pk=Recipe.objects.earliest('pk').pk).delete()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE recipes_recipe')
+
+    assert estimated_count(Recipe.objects.all()) == 2
+    assert cached_count(Recipe.objects.all()) == 2
@@ -0,0 +1,39 @@
+from assistance.pantry import PANTRY_VERSION, PantryIndex
+from assistance.versioning import get_version
+
+
+def test_pantry_change_recorded_after_commit(
+        user_client, recipe_payload, ingredients,
+        django_capture_on_commit_callbacks):
+    index = PantryIndex()
+    assert index.match([ingredients[3].pk], 10) == []
+    before = get_version(PANTRY_VERSION)
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = user_client.post(
+            '/api/recipes/', recipe_payload(), format='json')
+    assert get_version(PANTRY_VERSION) == before
+
+    for callback in callbacks:
+        callback()
+    assert index.match([ingredients[3].pk], 10) == [
+        (response.data['id'], 1, 1)]
+
+
+def test_pantry_update_replaces_state(
+        user_client, recipe_payload, ingredients,
+        django_capture_on_commit_callbacks):
+    index = PantryIndex()
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe_id = user_client.post(
+            '/api/recipes/', recipe_payload(), format='json').data['id']
+    index.match([], 10)
+    old_postings, old_recipes = index._state
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.patch(f'/api/recipes/{recipe_id}/', {'ingredients': [
+            {'id': ingredients[0].pk, 'amount': 100}]}, format='json')
+    assert index.match([ingredients[0].pk], 10) == [(recipe_id, 1, 0)]
+    assert index.match([ingredients[3].pk], 10) == []
+    # Прежнее состояние, которое мог читать другой поток, не изменилось.
+    assert old_recipes[recipe_id] == (ingredients[3].pk, ingredients[4].pk)
+    assert list(old_postings[ingredients[3].pk]) == [recipe_id]
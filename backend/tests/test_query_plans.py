@@ -0,0 +1,50 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from recipes.management.commands.check_query_plans import (main_queries,
+                                                           plan_problems)
+from recipes.models import Cart, Favorite, Follow
+
+
+@pytest.fixture
+def seeded(user, author, make_recipes):
+    """Небольшая база, на которой есть что читать каждому запросу."""
+    Follow.objects.create(user=user, following=author)
+    recipes = make_recipes(5)
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in recipes[:3])
+    Cart.objects.bulk_create(
+        Cart(user=user, recipe=recipe) for recipe in recipes[1:4])
+    return user
+
+
+def test_main_queries_use_indexes(seeded):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Как в check_query_plans: на маленькой базе Seq Scan
+            # выгоднее, а проверяем мы наличие индекса.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+    problems = {}
+    for name, queryset, allow_sort in main_queries(seeded):
+        found = plan_problems(queryset.explain(), allow_sort)
+        if found:
+            problems[name] = found
+    assert problems == {}
+
+
+def test_plan_problems_reports_scan_and_sort():
+    if connection.vendor == 'postgresql':
+        plan = 'Sort  (cost=1)\n  ->  Seq Scan on recipes_recipe'
+    else:
+        plan = ('SCAN recipes_recipe\n'
+                'USE TEMP B-TREE FOR ORDER BY')
+    assert plan_problems(plan, False) == [
+        'полный просмотр recipes_recipe', 'сортировка без индекса']
+    assert plan_problems(plan, True) == ['полный просмотр recipes_recipe']
+
+
+def test_check_query_plans_command(seeded, capsys):
+    call_command('check_query_plans', '--user', str(seeded.pk))
+    assert 'Все планы используют индексы.' in capsys.readouterr().out
@@ -0,0 +1,35 @@
+import pytest
+
+from recipes.models import Cart, Favorite
+
+# COUNT(*) или проверка существования, рецепты, тэги, ингредиенты и
+# загрузка отозванных JWT: кэш очищается перед каждым тестом.
+LIST_QUERIES = 5
+DETAIL_QUERIES = 5
+
+
+@pytest.mark.parametrize('limit', (2, 20, 50))
+def test_recipe_list_query_count(user, user_client, make_recipes,
+                                  django_assert_num_queries, limit):
+    recipes = make_recipes(50)
+    Favorite.objects.create(user=user, recipe=recipes[0])
+    Cart.objects.create(user=user, recipe=recipes[1])
+
+    with django_assert_num_queries(LIST_QUERIES):
+        response = user_client.get(f'/api/recipes/?limit={limit}')
+
+    assert response.status_code == 200
+    assert len(response.data['results']) == limit
+
+
+def test_recipe_detail_query_count(user, user_client, make_recipes,
+                                   django_assert_num_queries):
+    recipe, = make_recipes(1)
+    Favorite.objects.create(user=user, recipe=recipe)
+
+    with django_assert_num_queries(DETAIL_QUERIES):
+        response = user_client.get(f'/api/recipes/{recipe.pk}/')
+
+    assert response.status_code == 200
+    assert response.data['is_favorited'] is True
+    assert len(response.data['ingredients']) == 3
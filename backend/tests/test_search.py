@@ -0,0 +1,49 @@
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+
+
+def search(client, query):
+    return [recipe['name'] for recipe in client.get(
+        '/api/recipes/', {'search': query}).data['results']]
+
+
+def test_api_changes_reach_search_index(
+        user_client, recipe_payload, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        response = user_client.post('/api/recipes/', recipe_payload(
+            name='Борщ новый'), format='json')
+    assert response.status_code == 201
+    url = f'/api/recipes/{response.data["id"]}/'
+    assert search(user_client, 'борщ') == ['Борщ новый']
+    assert search(user_client, 'свекла') == ['Борщ новый']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.patch(url, {'name': 'Щи'}, format='json')
+    assert search(user_client, 'борщ') == []
+    assert search(user_client, 'щи') == ['Щи']
+    call_command('rebuild_search_index', '--check')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user_client.delete(url)
+    assert search(user_client, 'щи') == []
+    call_command('rebuild_search_index', '--check')
+
+
+@pytest.mark.skipif(connection.vendor != 'sqlite',
+                    reason='триггеры FTS5 есть только в SQLite')
+def test_rebuild_repairs_dropped_triggers(
+        user_client, recipe_payload, django_capture_on_commit_callbacks):
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TRIGGER recipes_recipe_fts_insert')
+    user_client.post('/api/recipes/', recipe_payload(), format='json')
+    assert search(user_client, 'борщ') == []
+    with pytest.raises(CommandError):
+        call_command('rebuild_search_index', '--check')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command('rebuild_search_index')
+
+    call_command('rebuild_search_index', '--check')
+    assert search(user_client, 'борщ') == ['Борщ']
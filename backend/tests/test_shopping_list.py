@@ -0,0 +1,20 @@
+from assistance.shopping_list import build_pdf
+
+
+def test_pdf_download(user_client, make_recipes):
+    recipe, = make_recipes(1)
+    user_client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+    response = user_client.get(
+        '/api/recipes/download_shopping_cart/?format=pdf')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/pdf'
+    assert b''.join(response.streaming_content).startswith(b'%PDF')
+
+
+def test_pdf_spools_to_disk_over_limit(user, make_recipes, settings):
+    settings.SHOPPING_LIST_PDF_SPOOL_SIZE = 1
+    recipe, = make_recipes(1)
+    user.buyer.create(recipe=recipe)
+    pdf = build_pdf(user)
+    assert pdf._rolled
+    assert pdf.read(4) == b'%PDF'
@@ -0,0 +1,41 @@
+import struct
+
+from assistance.similarity import (SIGNATURE_FORMAT, minhash,
+                                   recipe_features)
+from recipes.models import RecipeBucket, RecipeSignature
+
+
+def stored_signature(recipe):
+    return list(struct.unpack(SIGNATURE_FORMAT, bytes(
+        RecipeSignature.objects.get(recipe=recipe).minhash)))
+
+
+def expected_signature(recipe):
+    return minhash(recipe_features([recipe.pk])[recipe.pk])
+
+
+def test_tags_only_update_reindexes_similarity(
+        user_client, user, tags, recipe_payload):
+    response = user_client.post(
+        '/api/recipes/', recipe_payload(), format='json')
+    assert response.status_code == 201
+    recipe = user.recipes.get(pk=response.data['id'])
+    buckets = set(RecipeBucket.objects.filter(
+        recipe=recipe).values_list('band', 'bucket'))
+
+    response = user_client.patch(
+        f'/api/recipes/{recipe.pk}/',
+        {'tags': [tag.pk for tag in tags]}, format='json')
+    assert response.status_code == 200
+    assert stored_signature(recipe) == expected_signature(recipe)
+    assert set(RecipeBucket.objects.filter(
+        recipe=recipe).values_list('band', 'bucket')) != buckets
+
+
+def test_reverse_tag_changes_reindex_similarity(make_recipes, tags):
+    recipe, = make_recipes(1)
+    tags[2].recipes.add(recipe)
+    assert stored_signature(recipe) == expected_signature(recipe)
+
+    tags[2].recipes.clear()
+    assert stored_signature(recipe) == expected_signature(recipe)
@@ -0,0 +1,33 @@
+from django.db.models.deletion import Collector
+
+from assistance.versioning import get_version, table_version_name
+from recipes.models import AmountOfIngredient, Favorite, Recipe
+
+
+def version(model):
+    return get_version(table_version_name(model._meta.db_table))
+
+
+def test_recipe_children_are_fast_deleted(user, make_recipes):
+    recipe, = make_recipes(1)
+    Favorite.objects.create(user=user, recipe=recipe)
+    collector = Collector(using='default')
+
+    assert collector.can_fast_delete(Favorite.objects.filter(recipe=recipe))
+    assert collector.can_fast_delete(
+        AmountOfIngredient.objects.filter(recipe=recipe))
+
+
+def test_versions_bumped_after_commit(user, make_recipes,
+                                      django_capture_on_commit_callbacks):
+    recipe, = make_recipes(1)
+    Favorite.objects.create(user=user, recipe=recipe)
+    before = {model: version(model) for model in (Recipe, Favorite)}
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        recipe.delete()
+    assert {model: version(model) for model in before} == before
+
+    for callback in callbacks:
+        callback()
+    assert all(version(model) != before[model] for model in before)
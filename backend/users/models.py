@@ -41,3 +41,14 @@ class User(AbstractUser):
     def save(self, *args, **kwargs):
         self.is_staff = True
         super().save(*args, **kwargs)
+
+
+class RevokedToken(models.Model):
+    "Отозванный JWT; строка нужна только до истечения срока токена."
+    jti = models.CharField(
+        max_length=255,
+        unique=True,
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+    )